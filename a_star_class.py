@@ -3,67 +3,88 @@
 import pygame
 from pygame.locals import *
 from game_constants import *
+import heapq
 import unittest
-import map_class
+import grid_class
+import profiler_class
+from tile_class import Tile
 
 class A_Star():
-
-    def __init__(self):
+    ''' A_Star class : finds the cheapest path between two tiles of the map
+
+        : attributes:   use_heap - when True the open list is kept as a binary heap
+                        of (fval, hval, tile_no) entries. Stale entries are skipped
+                        when popped (lazy deletion) instead of being searched for,
+                        and hvals are only computed for tiles that reach the open list.
+                        When False the original linear-scan search is used.
+                        open_set/closed_set mirror the open and closed lists so the
+                        membership checks don't have to walk them.
+                        grid - the Grid searched over, its neighbour table gives the
+                        surrounding tiles. The shared grid_class.get_grid(tiles) by default
+                        tiles - number of tiles along a side of the (square) grid,
+                        TILES by default
+                        diagonal - when True tiles have 8 neighbours instead of 4. A
+                        diagonal step costs 14 instead of 10 and may not cut the corner
+                        of a tile with walkability CORNER_WALKABILITY or more (a
+                        building), and the hval is the octile distance instead of the
+                        Manhattan distance
+                        nodes_expanded - tiles closed by the last run_AStar call
+
+        run_AStar is a loop rather than a recursion, so the stack depth no longer
+        grows with the length of the path, and it takes an optional max_expansions
+        budget after which it gives up and returns 0.
+    '''
+
+    def __init__(self, use_heap=False, tiles=TILES, grid=None, diagonal=False):
         self.tile_dict = {}
         self.start = 0
         self.target = 0
-        self.closed_list = []
+        self.closed_set = set()
         self.open_list = []
+        self.open_set = set()
         self.path_list = []
         self.LFT = 0
+        self.use_heap = use_heap
+        self.grid = grid if grid is not None else grid_class.get_grid(tiles)
+        self.tiles = self.grid.tiles
+        self.diagonal = diagonal
+        self.nodes_expanded = 0
 
 
     def get_surrounding_tiles(self, tile):
-        #print("\n")
-        #print("xxxx get_surrounding_tiles xxxx")
-        #print("The center tile: {0}".format(tile))
-        surrounding_list = [tile+N, tile+E, tile+S, tile+W]
-        #print("These are the surrounding tiles, raw: {0}".format(surrounding_list))
-        # we want to remove tile number that are either OFF the grid
-        # ex. tile 1 will get tile 0 to its west.
-
-        rem_list = [] # list of tiles to remove from surrounding_list
-        if tile % TILES == 0 and tile+E not in rem_list:
-            rem_list.append(tile+E)
-            #print("Removing east tile: {0}".format(tile+E))
-        if tile % TILES == 1 and tile+W not in rem_list:
-            rem_list.append(tile+W)
-            #print("Removing west tile: {0}".format(tile+W))
-        if (tile-1) / TILES <= 1 and tile+S not in rem_list:
-            rem_list.append(tile+S)
-            #print("Removing south tile: {0}".format(tile+S))
-        if (tile-1) / TILES >= TILES-1 and tile+N not in rem_list:
-            rem_list.append(tile+N)
-            #print("Removing north tile: {0}".format(tile+N))
-        # We also want to remove all tiles that have already been added to
-        # closed list (so we don't traverse them again)
-        for x in self.closed_list:
-            if x not in rem_list:
-                rem_list.append(x)
-        #print("These are tiles to be removed: {0}".format(rem_list))
-        # Finally, remove the unwanted tiles from the surrounding_tiles list
-        for tile in rem_list:
-            if tile in surrounding_list:
-                surrounding_list.remove(tile)
-        #print("Finally, the surrounding tiles are: {0}".format(surrounding_list))
-
-
-        return surrounding_list
+        # the neighbours come from the grid's table, already without the tiles
+        # OFF the grid (ex. tile 1 has no tile to its west). We also want to
+        # remove all tiles that have already been added to closed list (so we
+        # don't traverse them again)
+        closed_set = self.closed_set
+        if not self.diagonal:
+            return [x for x in self.grid.get_surrounding_tiles(tile) if x not in closed_set]
+        return [x for x in self.grid.get_diagonal_surrounding_tiles(tile)
+                if x not in closed_set and not self.cuts_corner(tile, x)]
 
 
-    def set_all_hvals(self):
-        targetx = (self.target-1)%TILES
-        targety = (self.target-1)/TILES + 1
+    def cuts_corner(self, tile_no, next_no):
+        ''' True for a diagonal step that squeezes past the corner of a building '''
+        if not self.grid.is_diagonal(tile_no, next_no):
+            return False
+        return any(self.tile_dict[side].walkability >= CORNER_WALKABILITY
+                   for side in self.grid.get_corner_tiles(tile_no, next_no))
+
 
+    def set_all_hvals(self):
         for tile in self.tile_dict:
-            tilex = (tile-1)%TILES
-            tiley = (tile-1)/TILES + 1
-            self.tile_dict[tile].hval = 10*(abs(targetx-tilex)+abs(targety-tiley))
+            self.tile_dict[tile].hval = self.get_hval(tile)
+
+
+    def get_hval(self, tile_no):
+        ''' Manhattan distance to the target, for a single tile, or the octile
+            distance (14 per diagonal step, 10 per straight one) in diagonal mode '''
+        tilex, tiley = (tile_no-1) % self.tiles, (tile_no-1) // self.tiles
+        targetx, targety = (self.target-1) % self.tiles, (self.target-1) // self.tiles
+        dx, dy = abs(targetx-tilex), abs(targety-tiley)
+        if self.diagonal:
+            return 10*max(dx, dy) + 4*min(dx, dy)
+        return 10*(dx+dy)
 
 
     def set_gval(self, cur_gval, dest_tile):
@@ -81,66 +102,133 @@ class A_Star():
         self.start = start
         self.target = target
 
-        self.open_list.append(start)
-        self.set_all_hvals()
+        self.open_set.add(start)
+        if self.use_heap:
+            # hvals are filled in as tiles are pushed, see push_open()
+            self.tile_dict[start].hval = self.get_hval(start)
+            self.set_fval(start)
+            self.push_open(start)
+        else:
+            self.open_list.append(start)
+            self.set_all_hvals()
 
 
     def find_LFT(self):
-        possibleFVals = []
-        for tile_no in self.open_list:
-            possibleFVals.append(self.tile_dict[tile_no].fval)
-
+        min_fval = min(self.tile_dict[tile_no].fval for tile_no in self.open_list)
         for tile_no in self.open_list:
-            if self.tile_dict[tile_no].fval == min(possibleFVals):
+            if self.tile_dict[tile_no].fval == min_fval:
                 return tile_no
 
         return tile_no
 
 
+    def push_open(self, tile_no):
+        tile = self.tile_dict[tile_no]
+        heapq.heappush(self.open_list, (tile.fval, tile.hval, tile_no))
+
+
+    def pop_LFT(self):
+        ''' Pop the open tile with the lowest fval off the heap. Entries left behind
+            by a later, cheaper push (or for tiles already closed) are discarded '''
+        while self.open_list:
+            fval, hval, tile_no = heapq.heappop(self.open_list)
+            if tile_no not in self.closed_set and fval == self.tile_dict[tile_no].fval:
+                return tile_no
+        return 0
+
+
     def get_cost(self, source_tile_no, dest_tile_no):
-        diff = source_tile_no - dest_tile_no
-        if diff in (N,S,E,W):
+        diff = abs(source_tile_no - dest_tile_no)
+        if diff in (1, self.tiles):
             return 10
-        if diff in (NW, NE, SW, SE):
+        if diff in (self.tiles-1, self.tiles+1):
             return 14
 
 
-    def run_AStar(self, current_tile_no):
-        #print("\nxxxx run_AStar xxxx")
-        #print("Current tile is: {0}".format(current_tile_no))
-        if current_tile_no == self.target:
-            #print("Returning tile: {0}, which is same as target: {1}".format(current_tile_no, self.target))
-            return current_tile_no
+    def run_AStar(self, current_tile_no, max_expansions=None):
+        """ Search from current_tile_no until the target is reached. Returns the
+            target, or 0 when there is no path or max_expansions tiles were
+            expanded first """
+        self.nodes_expanded = 0
+        if self.use_heap:
+            found = self.run_heap_AStar(current_tile_no, max_expansions)
         else:
+            found = self.run_list_AStar(current_tile_no, max_expansions)
+        profiler_class.PROFILER.count('astar_nodes', self.nodes_expanded)
+        return found
+
+
+    def run_list_AStar(self, current_tile_no, max_expansions=None):
+        #print("\nxxxx run_AStar xxxx")
+        while current_tile_no != self.target:
+            #print("Current tile is: {0}".format(current_tile_no))
+            if max_expansions is not None and self.nodes_expanded >= max_expansions:
+                return 0
             self.open_list.remove(current_tile_no)
-            self.closed_list.append(current_tile_no)
+            self.open_set.discard(current_tile_no)
+            self.closed_set.add(current_tile_no)
+            self.nodes_expanded += 1
             #print("Removed tile from open_list, which looks like: {0}".format(self.open_list))
             surrounding_tiles = self.get_surrounding_tiles(current_tile_no)
             #print("Removed tile from open_list, which looks like: {0}".format(surrounding_tiles))
             for tile_no in surrounding_tiles:
-                if tile_no not in self.open_list:
+                if tile_no not in self.open_set:
                     self.tile_dict[tile_no].parent = current_tile_no
                     self.set_gval(   self.tile_dict[current_tile_no].gval +
                                     self.get_cost(current_tile_no, tile_no),
                                     tile_no)
                     self.set_fval(tile_no)
                     self.open_list.append(tile_no)
+                    self.open_set.add(tile_no)
 
-                elif tile_no in self.open_list:
+                else:
                     if (self.get_cost(current_tile_no, tile_no) + self.tile_dict[current_tile_no].gval) * self.tile_dict[tile_no].walkability < self.tile_dict[tile_no].gval:
                         self.tile_dict[tile_no].parent = current_tile_no
 
+            if not self.open_list:
+                return 0
             self.LFT = self.find_LFT()
             #print("Next tile to go to is: {0}".format(self.LFT))
-            self.run_AStar(self.LFT)
-            return self.LFT
+            current_tile_no = self.LFT
+        #print("Returning tile: {0}, which is same as target: {1}".format(current_tile_no, self.target))
+        return current_tile_no
+
+
+    def run_heap_AStar(self, current_tile_no, max_expansions=None):
+        ''' Same search as run_AStar, but the open list is a binary heap and the
+            step cost into a tile is get_cost() weighted by the tile's walkability '''
+        while current_tile_no:
+            if current_tile_no == self.target:
+                self.LFT = current_tile_no
+                return current_tile_no
+            if max_expansions is not None and self.nodes_expanded >= max_expansions:
+                return 0
+            self.open_set.discard(current_tile_no)
+            self.closed_set.add(current_tile_no)
+            self.nodes_expanded += 1
+            cur_gval = self.tile_dict[current_tile_no].gval
+            for tile_no in self.get_surrounding_tiles(current_tile_no):
+                tile = self.tile_dict[tile_no]
+                gval = cur_gval + self.get_cost(current_tile_no, tile_no)*tile.walkability
+                if tile_no not in self.open_set:
+                    tile.hval = self.get_hval(tile_no)
+                elif gval >= tile.gval:
+                    continue
+                tile.parent = current_tile_no
+                tile.gval = gval
+                self.set_fval(tile_no)
+                self.open_set.add(tile_no)
+                self.push_open(tile_no)
+            current_tile_no = self.pop_LFT()
+        self.LFT = 0
+        return self.LFT
 
 
     def get_path(self):
         #print("\nxxxx get_path xxxx")
         tile_no = self.target
         #print("Starting at: {0}".format(tile_no))
-        while tile_no is not self.start:
+        while tile_no != self.start:
             self.path_list.append(tile_no)
             #print("Next node is: {0}".format(tile_no))
             tile_no = self.tile_dict[tile_no].parent
@@ -154,14 +242,17 @@ class A_Star():
 
         self.start = 0
         self.target = 0
-        self.closed_list = []
+        self.closed_set = set()
         self.open_list = []
+        self.open_set = set()
         self.path_list = []
         self.LFT = 0
+        self.nodes_expanded = 0
 
 class TestAStar(unittest.TestCase):
     def setUp(self):
-        self.test_map = map_class.LevelMap()
+        import map_class
+        self.test_map = map_class.LevelMap(headless=True)
         self.test_map.initialize_tiles()
         self.test_astar = A_Star()
         self.test_astar.init_AStar(self.test_map.return_dict_of_tiles(), 1,100)
@@ -204,5 +295,66 @@ class TestAStar(unittest.TestCase):
         self.assertEquals(self.test_astar.get_path(), [1,2,3,4,5,6,7,8,9,10], "AStar doesn't return accurate path, going from 10 to 1")
 
 
+    def testHeapPath(self):
+        heap_astar = A_Star(use_heap=True)
+        heap_astar.init_AStar(self.test_map.return_dict_of_tiles(), 1, 6*TILES+1)
+        heap_astar.run_AStar(heap_astar.start)
+        self.assertEqual(heap_astar.get_path(), [1 + TILES*row for row in range(6, -1, -1)],
+                            "Heap AStar doesn't return accurate path, going from 1 to {0}".format(6*TILES+1))
+        heap_astar.reset()
+
+        heap_astar.init_AStar(self.test_map.return_dict_of_tiles(), 10, 1)
+        heap_astar.run_AStar(heap_astar.start)
+        self.assertEqual(heap_astar.get_path(), [1,2,3,4,5,6,7,8,9,10], "Heap AStar doesn't return accurate path, going from 10 to 1")
+        heap_astar.reset()
+
+        # with a uniform grid every shortest path from corner to corner has the same length
+        heap_astar.init_AStar(self.test_map.return_dict_of_tiles(), 1, TILES*TILES)
+        heap_astar.run_AStar(heap_astar.start)
+        self.assertEqual(len(heap_astar.get_path()), 2*TILES-1, "Heap AStar path from corner to corner is not the shortest")
+
+
+    def testDiagonalPath(self):
+        tiles = 30
+        tile_dict = {n: Tile('road', n, 0, 0, TILESIZE, TILESIZE) for n in range(1, tiles*tiles+1)}
+        nodes_expanded = []
+        for diagonal in (False, True):
+            astar = A_Star(use_heap=True, tiles=tiles, diagonal=diagonal)
+            astar.init_AStar(tile_dict, 1, tiles*tiles)
+            astar.run_AStar(astar.start)
+            nodes_expanded.append(astar.nodes_expanded)
+            path_length = len(astar.get_path())
+            astar.reset()
+        self.assertEqual(path_length, tiles, "Diagonal path from corner to corner should go straight across")
+        self.assertTrue(nodes_expanded[1] < nodes_expanded[0])
+
+        # a building on either side of a diagonal step blocks it
+        tile_dict[2].type = 'city'
+        tile_dict[2].set_walkability()
+        astar.init_AStar(tile_dict, 1, tiles+2)
+        astar.run_AStar(astar.start)
+        self.assertEqual(astar.get_path(), [tiles+2, tiles+1, 1])
+        astar.reset()
+
+
+    def testLargeGrid(self):
+        # long enough that the old recursive run_AStar ran out of stack
+        tiles = 60
+        tile_dict = {n: Tile('empty', n, 0, 0, TILESIZE, TILESIZE) for n in range(1, tiles*tiles+1)}
+        for use_heap in (False, True):
+            big_astar = A_Star(use_heap=use_heap, tiles=tiles)
+            big_astar.init_AStar(tile_dict, 1, tiles*tiles)
+            self.assertEqual(big_astar.run_AStar(big_astar.start), tiles*tiles)
+            self.assertEqual(len(big_astar.get_path()), 2*tiles-1)
+            self.assertTrue(big_astar.nodes_expanded > 0)
+            big_astar.reset()
+
+            big_astar.init_AStar(tile_dict, 1, tiles*tiles)
+            self.assertEqual(big_astar.run_AStar(big_astar.start, max_expansions=10), 0,
+                                "AStar should give up once the expansion budget is spent")
+            self.assertEqual(big_astar.nodes_expanded, 10)
+            big_astar.reset()
+
+
 if __name__ == '__main__':
     unittest.main()
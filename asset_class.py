@@ -0,0 +1,163 @@
+#
+# asset_class - keeps the images from artwork/ loaded, so they are read from
+#               disk and decoded once instead of on every frame, and does the
+#               same for fonts and rendered text
+#
+
+import os
+import pygame
+from collections import OrderedDict
+from game_constants import *
+import unittest
+import profiler_class
+
+ARTWORK_DIR = 'artwork'
+MAX_IMAGES = 64         # far more than artwork/ holds, it only bounds what else gets loaded
+
+
+class ImageCache():
+    ''' ImageCache class : loads images on first use and hands back the same
+                           surface afterwards
+
+        : attributes:   max_images - how many surfaces to keep at once. When full,
+                        the least recently used one is dropped (None = no limit)
+                        images - OrderedDict of path: surface, oldest use first
+                        loads - number of times an image was actually read from disk
+
+        : methods:      get(path) - the surface for path, loading it if needed
+                        preload(paths) - load paths up front, e.g. at startup
+                        preload_dir(directory) - preload every .png in directory
+
+        Surfaces are converted to the display's pixel format when a display
+        exists, so blitting them doesn't convert them again every frame.
+    '''
+
+    def __init__(self, max_images=MAX_IMAGES):
+        self.max_images = max_images
+        self.images = OrderedDict()
+        self.loads = 0
+
+
+    def load(self, path):
+        img = pygame.image.load(path)
+        self.loads += 1
+        profiler_class.PROFILER.count('image_loads')
+        if pygame.display.get_surface() is not None:
+            if img.get_alpha() is not None or img.get_colorkey() is not None:
+                img = img.convert_alpha()
+            else:
+                img = img.convert()
+        return img
+
+
+    def get(self, path):
+        img = self.images.get(path)
+        if img is None:
+            img = self.load(path)
+            self.images[path] = img
+            if self.max_images is not None and len(self.images) > self.max_images:
+                self.images.popitem(last=False)
+        else:
+            self.images.move_to_end(path)
+        return img
+
+
+    def preload(self, paths):
+        for path in paths:
+            self.get(path)
+
+
+    def preload_dir(self, directory=ARTWORK_DIR):
+        self.preload(os.path.join(directory, name)
+                     for name in sorted(os.listdir(directory)) if name.endswith('.png'))
+
+
+    def clear(self):
+        self.images.clear()
+
+
+class TextCache():
+    ''' TextCache class : renders each piece of text once and hands back the same
+                          surface afterwards
+
+        : attributes:   max_texts - how many rendered surfaces to keep at once. When
+                        full, the least recently used one is dropped (None = no limit)
+                        fonts - font_type, size: pygame Font, looked up once each
+                        texts - (font_type, size, color, text): surface, oldest use first
+                        renders - number of times text was actually rendered
+
+        : methods:      get(text, size, color, font_type) - the rendered surface
+    '''
+
+    def __init__(self, max_texts=4096):
+        self.max_texts = max_texts
+        self.fonts = {}
+        self.texts = OrderedDict()
+        self.renders = 0
+
+
+    def get_font(self, font_type, size):
+        font = self.fonts.get((font_type, size))
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.SysFont(font_type, size)
+            self.fonts[(font_type, size)] = font
+        return font
+
+
+    def get(self, text, size=10, color=WHITE, font_type='monospace'):
+        key = (font_type, size, tuple(color), str(text))
+        surface = self.texts.get(key)
+        if surface is None:
+            surface = self.get_font(font_type, size).render(key[3], True, color)
+            self.renders += 1
+            profiler_class.PROFILER.count('text_renders')
+            self.texts[key] = surface
+            if self.max_texts is not None and len(self.texts) > self.max_texts:
+                self.texts.popitem(last=False)
+        else:
+            self.texts.move_to_end(key)
+        return surface
+
+
+    def clear(self):
+        self.texts.clear()
+
+
+class TestImageCache(unittest.TestCase):
+    def setUp(self):
+        self.paths = [os.path.join(ARTWORK_DIR, name)
+                      for name in ('building1.png', 'building2.png', 'building3.png')]
+
+    def test_loads_once(self):
+        cache = ImageCache()
+        img = cache.get(self.paths[0])
+        self.assertIs(cache.get(self.paths[0]), img, "Cached image should be reused")
+        self.assertEqual(cache.loads, 1)
+        self.assertEqual(cache.max_images, MAX_IMAGES, "The cache should be bounded by default")
+
+    def test_lru_eviction(self):
+        cache = ImageCache(max_images=2)
+        cache.preload(self.paths[:2])
+        cache.get(self.paths[0])            # building2 is now the least recently used
+        cache.get(self.paths[2])
+        self.assertEqual(list(cache.images), [self.paths[0], self.paths[2]])
+        cache.get(self.paths[1])
+        self.assertEqual(cache.loads, 4)
+
+
+class TestTextCache(unittest.TestCase):
+    def test_renders_once(self):
+        cache = TextCache(max_texts=2)
+        label = cache.get(12)
+        self.assertIs(cache.get('12'), label, "Rendered text should be reused")
+        cache.get(12, color=RED)
+        cache.get(13)
+        self.assertEqual(cache.renders, 3)
+        self.assertEqual(len(cache.texts), 2)
+        self.assertEqual(len(cache.fonts), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
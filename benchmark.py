@@ -0,0 +1,231 @@
+#
+# benchmark - times path searches, map generation and drawing over a range of
+#             map sizes and building densities, writes the results as JSON and
+#             can compare them against a saved baseline to catch slowdowns
+#
+#   python benchmark.py --sizes 15 50 100 --output results.json
+#   python benchmark.py --compare results.json
+#
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import json
+import sys
+import time
+import unittest
+import numpy
+import pygame
+from game_constants import *
+import a_star_class
+import grid_search_class
+import jump_point_class
+import map_class
+import map_generator_class
+
+SIZES = [15, 50, 100]
+DENSITIES = [0.0, 0.5, 0.9]
+QUERIES = 5
+LEGACY_ASTAR_MAX_TILES = 50     # the linear-scan A_Star is far too slow beyond this
+FRAMES = 30
+
+
+def time_call(func, repeat):
+    ''' Best wall clock time of repeat calls to func, and its last return value '''
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best, value
+
+
+def make_map(tiles, density, seed, headless=True):
+    ''' Map with a generated road, where each other tile is a building with
+        probability density and an empty lot otherwise '''
+    generator = map_generator_class.MapGenerator(tiles, seed)
+    generator.draw_road()
+    density_random = numpy.random.default_rng(seed)
+    buildings = density_random.random(len(generator.types)) < density
+    buildings &= generator.types != map_generator_class.ROAD
+    buildings[0] = False
+    generator.types[buildings] = map_generator_class.CITY
+    generator.images[buildings] = density_random.integers(0, 4, int(buildings.sum()))
+
+    level_map = map_class.LevelMap(tiles=tiles, headless=headless)
+    level_map.initialize_tiles()
+    level_map.road = generator.road
+    level_map.seed = seed
+    level_map.set_tile_types(generator.types, generator.images)
+    return level_map
+
+
+def get_queries(tiles, seed):
+    query_random = numpy.random.default_rng(seed)
+    queries = [(1, tiles*tiles)]
+    while len(queries) < QUERIES:
+        start, target = query_random.integers(1, tiles*tiles+1, 2)
+        queries.append((int(start), int(target)))
+    return queries
+
+
+def bench_search(tiles, density, repeat, seed):
+    level_map = make_map(tiles, density, seed)
+    tile_dict = level_map.return_dict_of_tiles()
+    queries = get_queries(tiles, seed)
+    results = []
+
+    searchers = [('astar_heap', True)]
+    if tiles <= LEGACY_ASTAR_MAX_TILES:
+        searchers.append(('astar_legacy', False))
+    for name, use_heap in searchers:
+        def run_astar():
+            nodes_expanded = 0
+            astar = a_star_class.A_Star(use_heap=use_heap, tiles=tiles)
+            for start, target in queries:
+                astar.init_AStar(tile_dict, start, target)
+                astar.run_AStar(start)
+                nodes_expanded += astar.nodes_expanded
+                astar.reset()
+            return nodes_expanded
+        seconds, nodes_expanded = time_call(run_astar, repeat)
+        results.append({'name': name, 'tiles': tiles, 'density': density,
+                        'seconds': seconds, 'nodes_expanded': nodes_expanded})
+
+    grid_searches = [('grid_search', grid_search_class.GridSearch(grid=level_map.grid)),
+                     ('grid_search_diagonal', grid_search_class.GridSearch(grid=level_map.grid, diagonal=True)),
+                     ('jump_point', jump_point_class.JumpPointSearch(grid=level_map.grid))]
+    for name, grid_search in grid_searches:
+        grid_search.load_tiles(tile_dict)
+        def run_grid_search():
+            nodes_expanded = 0
+            for start, target in queries:
+                grid_search.search(start, target)
+                nodes_expanded += grid_search.nodes_expanded
+            return nodes_expanded
+        # jump_point builds its tables in the first run only, they are timed below
+        seconds, nodes_expanded = time_call(run_grid_search, repeat)
+        results.append({'name': name, 'tiles': tiles, 'density': density,
+                        'seconds': seconds, 'nodes_expanded': nodes_expanded})
+
+    jump_search = jump_point_class.JumpPointSearch(grid=level_map.grid)
+    jump_search.load_tiles(tile_dict)
+    seconds, value = time_call(jump_search.build_tables, repeat)
+    results.append({'name': 'jump_point_tables', 'tiles': tiles, 'density': density, 'seconds': seconds})
+    return results
+
+
+def bench_generation(tiles, repeat, seed):
+    seconds, generator = time_call(lambda: map_generator_class.MapGenerator(tiles, seed).generate(), repeat)
+    results = [{'name': 'generate', 'tiles': tiles, 'density': None, 'seconds': seconds}]
+
+    def run_map_creator():
+        level_map = map_class.LevelMap(tiles=tiles, headless=True)
+        level_map.map_creator(seed)
+        return level_map
+    seconds, level_map = time_call(run_map_creator, repeat)
+    results.append({'name': 'map_creator', 'tiles': tiles, 'density': None, 'seconds': seconds})
+    return results
+
+
+def bench_draw(tiles, density, repeat, seed):
+    ''' Seconds per frame of draw_tiles, tile by tile and from chunks, while the
+        map is dragged one tile per frame '''
+    level_map = make_map(tiles, density, seed, headless=False)
+    results = []
+    for name in ('draw_tiles', 'draw_chunks'):
+        if name == 'draw_chunks':
+            level_map.enable_chunks()
+        def run_frames():
+            level_map.camera.x = level_map.camera.y = 0
+            for frame in range(FRAMES):
+                level_map.display.fill(BLACK)
+                level_map.draw_tiles()
+                level_map.set_drag_offsets((-TILESIZE//4, TILESIZE//4))
+            pygame.display.flip()
+        seconds, value = time_call(run_frames, repeat)
+        results.append({'name': name, 'tiles': tiles, 'density': density, 'seconds': seconds/FRAMES})
+    return results
+
+
+def run_benchmarks(sizes=SIZES, densities=DENSITIES, repeat=3, seed=1):
+    results = []
+    for tiles in sizes:
+        results += bench_generation(tiles, repeat, seed)
+        for density in densities:
+            results += bench_search(tiles, density, repeat, seed)
+        results += bench_draw(tiles, densities[-1], repeat, seed)
+    return results
+
+
+def get_key(result):
+    return (result['name'], result['tiles'], result['density'])
+
+
+def compare_results(results, baseline, threshold=0.25):
+    ''' Results that are more than threshold (a fraction) slower than the baseline
+        entry with the same name, size and density, as a list of
+        (result, baseline seconds) '''
+    baseline_seconds = {get_key(result): result['seconds'] for result in baseline}
+    regressions = []
+    for result in results:
+        seconds = baseline_seconds.get(get_key(result))
+        if seconds is not None and result['seconds'] > seconds*(1 + threshold):
+            regressions.append((result, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time path searches, map generation and drawing")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="map sizes, in tiles along a side")
+    parser.add_argument('--densities', type=float, nargs='+', default=DENSITIES,
+                        help="fractions of non-road tiles that are buildings")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark, the best one counts")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="JSON file of earlier results to check for regressions against")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="how much slower than the baseline counts as a regression")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, args.densities, args.repeat, args.seed)
+    for result in results:
+        print("{name:>17} tiles={tiles:<5} density={density!s:<5} {seconds:.6f}s".format(**result))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=1)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare_results(results, json.load(baseline_file), args.threshold)
+        for result, seconds in regressions:
+            print("REGRESSION {name} tiles={tiles} density={density}: {seconds:.6f}s".format(**result) +
+                  " (baseline {0:.6f}s)".format(seconds))
+        if regressions:
+            return 1
+    return 0
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare_results(self):
+        baseline = [{'name': 'grid_search', 'tiles': 15, 'density': 0.5, 'seconds': 1.0},
+                    {'name': 'generate', 'tiles': 15, 'density': None, 'seconds': 1.0}]
+        results = [{'name': 'grid_search', 'tiles': 15, 'density': 0.5, 'seconds': 1.5},
+                   {'name': 'generate', 'tiles': 15, 'density': None, 'seconds': 1.1},
+                   {'name': 'generate', 'tiles': 50, 'density': None, 'seconds': 9.0}]
+        self.assertEqual(compare_results(results, baseline), [(results[0], 1.0)])
+
+    def test_small_run(self):
+        results = run_benchmarks(sizes=[8], densities=[0.5], repeat=1)
+        self.assertEqual(set(result['name'] for result in results),
+                         set(['generate', 'map_creator', 'astar_heap', 'astar_legacy',
+                              'grid_search', 'grid_search_diagonal', 'jump_point', 'jump_point_tables',
+                              'draw_tiles', 'draw_chunks']))
+        self.assertEqual(compare_results(results, results), [])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+#
+# camera_class - the view onto the map. Tiles stay where they were created
+#                (world coordinates) and the camera is moved instead
+#
+
+import pygame
+import numpy
+import random
+from game_constants import *
+import unittest
+import grid_class
+
+
+class Camera():
+    ''' Camera class : the window's rectangle in world coordinates
+
+        : attributes:   x, y - world coordinates of the window's upper left corner
+                        width, height - of the window
+                        tiles, tile_size - the grid the camera looks at. Its layout is the
+                        one LevelMap.initialize_tiles uses: tile 1 in the bottom left
+                        corner with its bottom edge at y = bottom, numbers increasing
+                        east along a row and then north a row at a time
+                        grid - the Grid of that size, tile numbers are converted with it
+
+        : methods:      move(dx, dy) - scroll the view
+                        visible_tiles() - numbers of the tiles overlapping the view,
+                        worked out from the camera rectangle, not by testing each tile
+                        to_screen(x, y) / to_world(x, y) - convert coordinates
+                        tile_at(point) - number of the tile under a window point, 0 if
+                        there is none. tiles_at(points) does the same for an array
+                        of points at once
+    '''
+
+    def __init__(self, tiles=TILES, tile_size=TILESIZE,
+                 width=WINDOWSIZE, height=WINDOWSIZE, bottom=WINDOWSIZE, grid=None):
+        self.x = 0
+        self.y = 0
+        self.width = width
+        self.height = height
+        self.grid = grid if grid is not None else grid_class.get_grid(tiles)
+        self.tiles = self.grid.tiles
+        self.tile_size = tile_size
+        self.bottom = bottom
+
+
+    def move(self, dx, dy):
+        self.x += dx
+        self.y += dy
+
+
+    def to_screen(self, x, y):
+        return (x - self.x, y - self.y)
+
+
+    def to_world(self, x, y):
+        return (x + self.x, y + self.y)
+
+
+    def get_rect(self):
+        return pygame.Rect(self.x, self.y, self.width, self.height)
+
+
+    def tile_xy(self, tile_no):
+        ''' World coordinates of the upper left corner of tile_no '''
+        col, row = self.grid.get_col_row(tile_no)
+        return (col*self.tile_size, self.bottom - (row+1)*self.tile_size)
+
+
+    def tile_at(self, point):
+        ''' Number of the tile under the window point (x, y), or 0 off the map '''
+        col = (point[0] + self.x) // self.tile_size
+        row = (self.bottom - 1 - point[1] - self.y) // self.tile_size
+        return self.grid.get_tile_no(int(col), int(row))
+
+
+    def tiles_at(self, points):
+        ''' tile_at for a (n, 2) array of window points, as an array of n tile numbers '''
+        points = numpy.asarray(points)
+        cols = (points[:, 0] + self.x) // self.tile_size
+        rows = (self.bottom - 1 - points[:, 1] - self.y) // self.tile_size
+        on_map = (cols >= 0) & (cols < self.tiles) & (rows >= 0) & (rows < self.tiles)
+        return numpy.where(on_map, rows*self.tiles + cols + 1, 0).astype(numpy.int64)
+
+
+    def visible_range(self):
+        ''' (first_col, last_col, first_row, last_row) of the tiles overlapping the
+            view, clipped to the grid. The range is empty if first > last '''
+        size = self.tile_size
+        first_col = max(self.x // size, 0)
+        last_col = min((self.x + self.width - 1) // size, self.tiles-1)
+        # rows count up from the bottom of the map, while y counts down the screen
+        first_row = max((self.bottom - self.y - self.height) // size, 0)
+        last_row = min((self.bottom - self.y - 1) // size, self.tiles-1)
+        return (first_col, last_col, first_row, last_row)
+
+
+    def visible_tiles(self):
+        first_col, last_col, first_row, last_row = self.visible_range()
+        for row in range(first_row, last_row+1):
+            row_start = row*self.tiles + 1
+            for col in range(first_col, last_col+1):
+                yield row_start + col
+
+
+class TestCamera(unittest.TestCase):
+    def setUp(self):
+        self.camera = Camera()
+        self.tile_rects = {tile_no: pygame.Rect(self.camera.tile_xy(tile_no) + (TILESIZE, TILESIZE))
+                           for tile_no in range(1, TILES*TILES+1)}
+
+    def assert_visible(self):
+        view = self.camera.get_rect()
+        expected = sorted(tile_no for tile_no, rect in self.tile_rects.items() if rect.colliderect(view))
+        self.assertEqual(sorted(self.camera.visible_tiles()), expected,
+                            "Wrong visible tiles for camera at {0}".format((self.camera.x, self.camera.y)))
+
+    def test_visible_tiles(self):
+        self.assert_visible()
+        self.assertEqual(next(self.camera.visible_tiles()), 1)
+        for dx, dy in ((37, -120), (-200, -455), (TILESIZE*TILES, 0), (-1000, 1000)):
+            self.camera.move(dx, dy)
+            self.assert_visible()
+
+    def test_tile_at(self):
+        self.camera.move(-55, 130)
+        points = [(random.randrange(-100, WINDOWSIZE+100), random.randrange(-100, WINDOWSIZE+100))
+                  for i in range(200)]
+        for point in points:
+            world = self.camera.to_world(*point)
+            expected = [tile_no for tile_no, rect in self.tile_rects.items() if rect.collidepoint(world)]
+            self.assertEqual(self.camera.tile_at(point), (expected or [0])[0],
+                                "Wrong tile under point {0}".format(point))
+        self.assertEqual(list(self.camera.tiles_at(points)), [self.camera.tile_at(point) for point in points])
+
+    def test_coordinates(self):
+        self.camera.move(15, -30)
+        self.assertEqual(self.camera.to_world(*self.camera.to_screen(100, 200)), (100, 200))
+        self.assertEqual(self.camera.tile_xy(TILES+2), (TILESIZE, WINDOWSIZE - 2*TILESIZE))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,23 +5,27 @@
 #                   the buildings in the city are also derived from character class
 #
 
+import pygame
 from game_constants import *
+import grid_class
 
 class Character(pygame.sprite.Sprite):
+    ''' Character class : a single sprite on the map, standing on a tile
 
-    def __init__(self, start_tile):
-        pygame.sprite.Sprite.__init__(self)
-        self.current_tile = start_tile
-
+        : attributes:   current_tile - number of the tile it stands on
 
-    def get_xy_co-ordinates(self):
-        row = (self.tile_no - 1) / TILES
-        col = (self.tile_no) % TILES
-        if col == 0 :
-            col = TILES
-        return (row, col)
+        : methods:      get_xy_coordinates() - (row, col) of current_tile, the row
+                        counted from 0 and the column from 1
 
-def main():
+        Crowds of tanks and missiles are not Characters: unit_class.Units moves
+        and collides them together as arrays.
+    '''
 
+    def __init__(self, start_tile):
+        pygame.sprite.Sprite.__init__(self)
+        self.current_tile = start_tile
 
 
+    def get_xy_coordinates(self):
+        col, row = grid_class.get_grid(TILES).get_col_row(self.current_tile)
+        return (row, col+1)
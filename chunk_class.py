@@ -0,0 +1,174 @@
+#
+# chunk_class - the map pre-drawn onto a few large surfaces ("chunks"), so a
+#               frame is a handful of blits instead of a draw call per tile
+#
+
+import pygame
+from collections import OrderedDict
+from game_constants import *
+import unittest
+import profiler_class
+
+CHUNK_TILES = 16
+MAX_CHUNKS = 12       # a 16 tile chunk is 1280x1280 pixels, about 6.5 MB
+
+
+class ChunkedMapLayer():
+    ''' ChunkedMapLayer class : bakes the tiles of a LevelMap into chunk surfaces of
+                                chunk_tiles x chunk_tiles tiles each
+
+        : attributes:   level_map - the LevelMap whose tiles are drawn
+                        chunk_tiles - tiles along a side of a chunk
+                        max_chunks - how many baked chunks to keep. When more are baked,
+                        the least recently drawn ones are dropped (None = no limit)
+                        chunks - OrderedDict of (chunk_col, chunk_row): surface, for the
+                        baked chunks, least recently drawn first
+                        dirty - chunks that have to be baked again before being drawn
+                        bakes - number of times a chunk was (re)drawn from its tiles
+
+        : methods:      draw(surface, camera) - blit the chunks overlapping the view,
+                        baking any that are missing or dirty first
+                        invalidate_tile(tile_no) - mark the chunk holding tile_no dirty
+                        invalidate_all() - mark every chunk dirty
+    '''
+
+    def __init__(self, level_map, chunk_tiles=CHUNK_TILES, max_chunks=MAX_CHUNKS):
+        self.level_map = level_map
+        self.chunk_tiles = chunk_tiles
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()
+        self.dirty = set()
+        self.bakes = 0
+
+
+    def get_chunk_of_tile(self, tile_no):
+        tiles = self.level_map.camera.tiles
+        return (((tile_no-1) % tiles) // self.chunk_tiles, ((tile_no-1) // tiles) // self.chunk_tiles)
+
+
+    def invalidate_tile(self, tile_no):
+        chunk = self.get_chunk_of_tile(tile_no)
+        if chunk in self.chunks:
+            self.dirty.add(chunk)
+
+
+    def invalidate_all(self):
+        self.dirty.update(self.chunks)
+
+
+    def get_chunk_tiles(self, chunk):
+        ''' Range of columns and rows of the tiles in chunk, clipped to the grid '''
+        tiles = self.level_map.camera.tiles
+        first_col, first_row = chunk[0]*self.chunk_tiles, chunk[1]*self.chunk_tiles
+        last_col = min(first_col + self.chunk_tiles, tiles) - 1
+        last_row = min(first_row + self.chunk_tiles, tiles) - 1
+        return (first_col, last_col, first_row, last_row)
+
+
+    def get_chunk_xy(self, chunk):
+        ''' World coordinates of the upper left corner of chunk, which is the upper
+            left corner of its top left tile '''
+        first_col, last_col, first_row, last_row = self.get_chunk_tiles(chunk)
+        return self.level_map.camera.tile_xy(last_row*self.level_map.camera.tiles + first_col + 1)
+
+
+    def bake(self, chunk):
+        first_col, last_col, first_row, last_row = self.get_chunk_tiles(chunk)
+        surface = self.chunks.get(chunk)
+        if surface is None:
+            surface = pygame.Surface(((last_col - first_col + 1)*TILESIZE,
+                                      (last_row - first_row + 1)*TILESIZE))
+            if pygame.display.get_surface() is not None:
+                surface = surface.convert()
+            self.chunks[chunk] = surface
+        surface.fill(BLACK)
+
+        chunkx, chunky = self.get_chunk_xy(chunk)
+        tiles = self.level_map.camera.tiles
+        for row in range(first_row, last_row+1):
+            for col in range(first_col, last_col+1):
+                tile = self.level_map.tile_list[row*tiles + col]
+                self.level_map.draw_tile(surface, tile, tile.x - chunkx, tile.y - chunky)
+        self.dirty.discard(chunk)
+        self.bakes += 1
+        profiler_class.PROFILER.count('chunk_bakes')
+        return surface
+
+
+    def draw(self, surface, camera):
+        first_col, last_col, first_row, last_row = camera.visible_range()
+        if first_col > last_col or first_row > last_row:
+            return
+        blits = 0
+        for chunk_row in range(first_row // self.chunk_tiles, last_row // self.chunk_tiles + 1):
+            for chunk_col in range(first_col // self.chunk_tiles, last_col // self.chunk_tiles + 1):
+                chunk = (chunk_col, chunk_row)
+                chunk_surface = self.chunks.get(chunk)
+                if chunk_surface is None or chunk in self.dirty:
+                    chunk_surface = self.bake(chunk)
+                self.chunks.move_to_end(chunk)
+                surface.blit(chunk_surface, camera.to_screen(*self.get_chunk_xy(chunk)))
+                blits += 1
+        profiler_class.PROFILER.count('blits', blits)
+        # the chunks just drawn are the newest, so only ones out of view are dropped
+        # (unless more than max_chunks are in view at once)
+        while self.max_chunks is not None and len(self.chunks) > self.max_chunks:
+            chunk, chunk_surface = self.chunks.popitem(last=False)
+            self.dirty.discard(chunk)
+
+
+class TestChunkedMapLayer(unittest.TestCase):
+    def setUp(self):
+        import map_class
+        self.test_map = map_class.LevelMap()
+        self.test_map.map_creator()
+
+    def render(self):
+        self.test_map.display.fill(BLACK)
+        self.test_map.draw_tiles()
+        return pygame.image.tostring(self.test_map.display, 'RGB')
+
+    def test_same_as_tile_drawing(self):
+        for offsets in ((0, 0), (-130, 75), (-400, 410)):
+            self.test_map.set_drag_offsets(offsets)
+            self.test_map.chunks = None
+            tile_frame = self.render()
+            self.test_map.enable_chunks(chunk_tiles=4)
+            self.assertEqual(self.render(), tile_frame,
+                                "Chunked map looks different from the tile by tile map at {0}".format(offsets))
+
+    def test_invalidate_tile(self):
+        self.test_map.enable_chunks(chunk_tiles=4)
+        self.render()
+        bakes = self.test_map.chunks.bakes
+        self.test_map.set_tile_type(1, 'empty')
+        self.render()
+        self.assertEqual(self.test_map.chunks.bakes, bakes + 1,
+                            "Only the chunk holding the changed tile should be redrawn")
+
+    def test_max_chunks(self):
+        self.test_map.enable_chunks(chunk_tiles=4)
+        self.test_map.chunks.max_chunks = 9
+        for step in range(8):
+            self.test_map.set_drag_offsets((-TILESIZE, TILESIZE))
+            self.render()
+            self.assertTrue(len(self.test_map.chunks.chunks) <= 9)
+        bakes = self.test_map.chunks.bakes
+        self.render()
+        self.assertEqual(self.test_map.chunks.bakes, bakes, "Chunks in view should be kept")
+
+    def test_regenerate_map(self):
+        self.test_map.enable_chunks(chunk_tiles=4)
+        self.render()
+        for change in (lambda: self.test_map.map_creator(seed=2), self.test_map.draw_buildings,
+                       self.test_map.draw_road_thru_map):
+            change()
+            chunk_frame = self.render()
+            chunks = self.test_map.chunks
+            self.test_map.chunks = None
+            self.assertEqual(chunk_frame, self.render(), "Chunks should be redrawn after the map changed")
+            self.test_map.chunks = chunks
+
+
+if __name__ == '__main__':
+    unittest.main()
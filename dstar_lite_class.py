@@ -0,0 +1,207 @@
+#
+# dstar_lite_class - D* Lite: a planner that keeps its search between queries
+#                    and only repairs the part of it that a changed tile affects,
+#                    e.g. when the dragon burns down a building
+#
+
+import heapq
+import unittest
+from game_constants import *
+
+INFINITY = float('inf')
+
+
+class DStarLite():
+    ''' DStarLite class : incremental version of the GridSearch search. The search
+                          runs backwards from the target, so the start can move
+                          (move_start) and tiles can change (update_tiles) without
+                          starting over
+
+        : attributes:   grid - GridSearch giving the tiles' walkability and neighbours.
+                        Change the walkability there first, then call update_tiles()
+                        start, target - of the current plan
+                        gval, rhs - cost to the target from each tile, and the
+                        one-step lookahead of it. Tiles not in the dicts are at infinity
+                        open_keys - tile_no: key, for the tiles in the open list
+                        km - key modifier, grows as the start moves
+                        nodes_expanded - tiles expanded by the last plan/repair
+
+        : methods:      plan(start, target) - search from scratch, returns True if a
+                        path exists
+                        update_tiles(tile_nos) - repair the plan after the walkability
+                        of tile_nos changed
+                        move_start(tile_no) - carry on planning from another start
+                        get_path() - tile numbers from the start to the target
+
+        Costs are the ones GridSearch uses: stepping onto a tile costs 10 times
+        its walkability.
+    '''
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.start = 0
+        self.target = 0
+        self.last_start = 0
+        self.gval = {}
+        self.rhs = {}
+        self.open_list = []
+        self.open_keys = {}
+        self.km = 0
+        self.nodes_expanded = 0
+
+
+    def get_hval(self, tile_no):
+        ''' Manhattan distance from the start, the heuristic for a backwards search '''
+        tiles = self.grid.tiles
+        return 10*(abs((tile_no-1) % tiles - (self.start-1) % tiles) +
+                   abs((tile_no-1) // tiles - (self.start-1) // tiles))
+
+
+    def get_cost(self, tile_no):
+        ''' Cost of stepping onto tile_no '''
+        return 10*int(self.grid.walkability[tile_no])
+
+
+    def calc_key(self, tile_no):
+        best = min(self.gval.get(tile_no, INFINITY), self.rhs.get(tile_no, INFINITY))
+        return (best + self.get_hval(tile_no) + self.km, best)
+
+
+    def push_open(self, tile_no):
+        key = self.calc_key(tile_no)
+        self.open_keys[tile_no] = key
+        heapq.heappush(self.open_list, (key, tile_no))
+
+
+    def top_key(self):
+        ''' Smallest key in the open list, dropping entries that were replaced '''
+        while self.open_list:
+            key, tile_no = self.open_list[0]
+            if self.open_keys.get(tile_no) == key:
+                return key
+            heapq.heappop(self.open_list)
+        return (INFINITY, INFINITY)
+
+
+    def update_vertex(self, tile_no):
+        if tile_no != self.target:
+            self.rhs[tile_no] = min(self.get_cost(next_no) + self.gval.get(next_no, INFINITY)
+                                    for next_no in self.grid.get_surrounding_tiles(tile_no))
+        if self.gval.get(tile_no, INFINITY) != self.rhs.get(tile_no, INFINITY):
+            self.push_open(tile_no)
+        else:
+            self.open_keys.pop(tile_no, None)
+
+
+    def compute_shortest_path(self):
+        self.nodes_expanded = 0
+        gval, rhs = self.gval, self.rhs
+        while (self.top_key() < self.calc_key(self.start) or
+               rhs.get(self.start, INFINITY) != gval.get(self.start, INFINITY)):
+            key, tile_no = heapq.heappop(self.open_list)
+            new_key = self.calc_key(tile_no)
+            if key < new_key:
+                self.push_open(tile_no)
+                continue
+            del self.open_keys[tile_no]
+            self.nodes_expanded += 1
+            # stepping onto tile_no is how its neighbours reach the target through it
+            if gval.get(tile_no, INFINITY) > rhs.get(tile_no, INFINITY):
+                gval[tile_no] = rhs[tile_no]
+                for prev_no in self.grid.get_surrounding_tiles(tile_no):
+                    self.update_vertex(prev_no)
+            else:
+                gval[tile_no] = INFINITY
+                self.update_vertex(tile_no)
+                for prev_no in self.grid.get_surrounding_tiles(tile_no):
+                    self.update_vertex(prev_no)
+        return rhs.get(self.start, INFINITY) < INFINITY
+
+
+    def plan(self, start, target):
+        self.start = self.last_start = start
+        self.target = target
+        self.gval = {}
+        self.rhs = {target: 0}
+        self.open_list = []
+        self.open_keys = {}
+        self.km = 0
+        self.push_open(target)
+        return self.compute_shortest_path()
+
+
+    def update_tiles(self, tile_nos):
+        ''' The cost of stepping onto each of tile_nos changed, which changes the
+            lookahead of the tiles around them '''
+        for tile_no in set(tile_nos):
+            for prev_no in self.grid.get_surrounding_tiles(tile_no):
+                self.update_vertex(prev_no)
+        return self.compute_shortest_path()
+
+
+    def move_start(self, tile_no):
+        self.start = tile_no
+        self.km += self.get_hval(self.last_start)
+        self.last_start = tile_no
+        return self.compute_shortest_path()
+
+
+    def get_cost_to_target(self):
+        return self.gval.get(self.start, INFINITY)
+
+
+    def get_path(self):
+        ''' Tile numbers from the start to the target, [] if there is no path.
+            Tiles that changed since the last repair must be passed to
+            update_tiles() first, or the plan may lead in circles '''
+        if self.rhs.get(self.start, INFINITY) == INFINITY:
+            return []
+        path_list = [self.start]
+        tile_no = self.start
+        while tile_no != self.target:
+            tile_no = min(self.grid.get_surrounding_tiles(tile_no),
+                          key=lambda next_no: self.get_cost(next_no) + self.gval.get(next_no, INFINITY))
+            path_list.append(tile_no)
+        return path_list
+
+
+class TestDStarLite(unittest.TestCase):
+    def setUp(self):
+        import map_class
+        self.test_map = map_class.LevelMap(headless=True)
+        self.test_map.initialize_tiles()
+        self.grid = self.test_map.get_grid_search()
+        self.planner = DStarLite(self.grid)
+
+    def assert_cheapest(self):
+        path = self.planner.get_path()
+        self.assertEqual((path[0], path[-1]), (self.planner.start, self.planner.target))
+        self.grid.search(self.planner.start, self.planner.target)
+        self.assertEqual(self.grid.get_cost(list(reversed(path))), self.grid.get_cost(self.grid.get_path()),
+                            "D* Lite path is not the cheapest")
+        self.assertEqual(self.planner.get_cost_to_target(), self.grid.get_cost(path[::-1]))
+
+    def test_repair(self):
+        self.assertTrue(self.planner.plan(1, TILES*TILES))
+        self.assert_cheapest()
+        full_search = self.planner.nodes_expanded
+
+        # put buildings across the middle of the current path
+        path = self.planner.get_path()
+        changed = path[len(path)//2 - 1:len(path)//2 + 2]
+        for tile_no in changed:
+            self.test_map.set_tile_type(tile_no, 'city')
+        self.planner.update_tiles(changed)
+        self.assert_cheapest()
+        self.assertTrue(self.planner.nodes_expanded < full_search,
+                            "Repairing the plan should expand fewer tiles than planning from scratch")
+
+        # and burn one of them down again after moving along the path
+        self.planner.move_start(self.planner.get_path()[3])
+        self.test_map.set_tile_type(changed[1], 'road')
+        self.planner.update_tiles([changed[1]])
+        self.assert_cheapest()
+
+
+if __name__ == '__main__':
+    unittest.main()
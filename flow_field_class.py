@@ -0,0 +1,132 @@
+#
+# flow_field_class - one search from the target tells every tile on the map
+#                    which way to go, so any number of enemies can chase the
+#                    same target without a search each
+#
+
+import heapq
+import unittest
+import numpy
+from game_constants import *
+
+
+class FlowField():
+    ''' FlowField class : cost to reach the target from every tile, and the next
+                          tile to step to, from a single reverse Dijkstra pass
+
+        : attributes:   grid - GridSearch giving the tiles' walkability and neighbours
+                        target - the tile everything flows towards
+                        version - map version the field was computed for
+                        cost - cost of the cheapest path from each tile to the target,
+                        -1 where the target can't be reached
+                        next_tile - tile to step to from each tile, 0 at the target
+                        and where the target can't be reached
+                        computes - number of times the field was computed
+
+        : methods:      update(target, version) - recompute only if the target moved
+                        to another tile or the map changed, returns True if it did
+                        get_next_tile(tile_no) - where to go from tile_no, O(1)
+                        get_next_tiles(tile_nos) - the same for an array of tiles
+
+        Costs are the ones GridSearch uses: stepping onto a tile costs 10 times
+        its walkability.
+    '''
+
+    def __init__(self, grid):
+        self.grid = grid
+        size = len(grid.walkability)
+        self.cost = numpy.full(size, -1, dtype=numpy.int64)
+        self.next_tile = numpy.zeros(size, dtype=numpy.int64)
+        self.target = 0
+        self.version = None
+        self.computes = 0
+
+
+    def update(self, target, version):
+        if target == self.target and version == self.version:
+            return False
+        self.compute(target)
+        self.version = version
+        return True
+
+
+    def compute(self, target):
+        cost, next_tile = self.cost, self.next_tile
+        walkability = self.grid.walkability
+        get_surrounding_tiles = self.grid.get_surrounding_tiles
+        cost.fill(-1)
+        next_tile.fill(0)
+        cost[target] = 0
+        done = numpy.zeros(len(cost), dtype=bool)
+
+        open_heap = [(0, target)]
+        while open_heap:
+            tile_cost, tile_no = heapq.heappop(open_heap)
+            if done[tile_no]:
+                continue
+            done[tile_no] = True
+            # every neighbour can get here by stepping onto this tile
+            step_cost = tile_cost + 10*int(walkability[tile_no])
+            for prev_no in get_surrounding_tiles(tile_no):
+                if done[prev_no]:
+                    continue
+                prev_cost = cost[prev_no]
+                if prev_cost < 0 or step_cost < prev_cost:
+                    cost[prev_no] = step_cost
+                    next_tile[prev_no] = tile_no
+                    heapq.heappush(open_heap, (step_cost, prev_no))
+
+        self.target = target
+        self.computes += 1
+
+
+    def get_next_tile(self, tile_no):
+        return int(self.next_tile[tile_no])
+
+
+    def get_next_tiles(self, tile_nos):
+        return self.next_tile[tile_nos]
+
+
+    def get_path(self, tile_no):
+        ''' Tile numbers from tile_no to the target following the field, [] if the
+            target can't be reached from tile_no '''
+        if self.cost[tile_no] < 0:
+            return []
+        path_list = [tile_no]
+        while tile_no != self.target:
+            tile_no = int(self.next_tile[tile_no])
+            path_list.append(tile_no)
+        return path_list
+
+
+class TestFlowField(unittest.TestCase):
+    def setUp(self):
+        import map_class
+        self.test_map = map_class.LevelMap(headless=True)
+        self.test_map.map_creator()
+
+    def test_paths_are_cheapest(self):
+        field = self.test_map.get_flow_field(TILES*TILES)
+        grid = self.test_map.get_grid_search()
+        for start in (1, TILES, TILES*(TILES-1) + 1, TILES*TILES//2):
+            path = field.get_path(start)
+            self.assertEqual((path[0], path[-1]), (start, TILES*TILES))
+            grid.search(start, TILES*TILES)
+            self.assertEqual(grid.get_cost(list(reversed(path))), grid.get_cost(grid.get_path()),
+                                "Flow field path from {0} is not the cheapest".format(start))
+            self.assertEqual(field.cost[start], grid.get_cost(grid.get_path()))
+        self.assertEqual(list(field.get_next_tiles([start, TILES*TILES])), [path[1], 0])
+
+    def test_recomputes_only_on_change(self):
+        field = self.test_map.get_flow_field(1)
+        self.test_map.get_flow_field(1)
+        self.assertEqual(field.computes, 1)
+        self.test_map.get_flow_field(2)
+        self.test_map.set_tile_type(TILES*TILES, 'empty')
+        self.test_map.get_flow_field(2)
+        self.assertEqual(field.computes, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,8 @@
 
 WINDOWSIZE = 540
 
-TILE_WALKABILITY = {'city': 100, 'road': 1, 'empty':5}
+TILE_WALKABILITY = {'city': 100, 'road': 1, 'empty':20}
+CORNER_WALKABILITY = 100    # diagonal steps can't cut the corner of a tile this hard to walk
 
 
 TILESIZE = 80
@@ -53,3 +54,8 @@ NE = N + E
 NW = N + W
 SE = S + E
 SW = S + W
+
+TICK_RATE = 30              # simulation updates per second, see game_loop_class
+MAX_FPS = 60                # frames drawn per second at most
+IDLE_FPS = 15               # frames per second while nothing on screen changes
+MAX_TICKS_PER_FRAME = 10    # ticks run in one frame at most, after a stall
@@ -0,0 +1,180 @@
+#
+# game_loop_class - drives the game: the simulation is updated at a fixed tick
+#                   rate, frames are drawn at a capped (or vsynced) rate between
+#                   ticks, and nothing is drawn while nothing on screen changed
+#
+
+import time
+import unittest
+import pygame
+from game_constants import *
+import profiler_class
+
+
+def interpolate(previous, current, alpha):
+    ''' The value alpha of the way from previous to current, for drawing something
+        that moves between its positions at the last two ticks '''
+    return previous + (current - previous)*alpha
+
+
+def flip_waits(flips=3, min_ms=4):
+    ''' Whether pygame.display.flip() waits for the display. Some drivers take a
+        vsync=1 window without complaint and still flip straight away, and with
+        vsync the loop doesn't cap the frame rate itself '''
+    start = time.perf_counter()
+    for i in range(flips):
+        pygame.display.flip()
+    return (time.perf_counter() - start)*1000 >= flips*min_ms
+
+
+class GameLoop():
+    ''' GameLoop class : runs update(tick_seconds) TICK_RATE times a second whatever the
+                         frame rate, then render(alpha) once per frame
+
+        : attributes:   update - called once per tick with the tick length in seconds.
+                        Everything that moves (units, timers) moves in here, so the
+                        game plays the same at any frame rate
+                        render - called to draw a frame, with alpha, how far (0 to 1) the
+                        frame is from the last tick to the next one. Moving things are
+                        drawn interpolate(previous, current, alpha) of the way along
+                        get_state - if given, a frame is only drawn when what it returns
+                        (e.g. LevelMap.get_view_state()) differs from the last drawn
+                        frame's, or after mark_dirty(). Between such frames the loop
+                        is idle: it draws nothing and sleeps to idle_fps
+                        tick_rate - simulation ticks per second
+                        max_fps - frames per second cap while drawing, 0 for none (with
+                        vsync the flip waits for the display instead)
+                        idle_fps - frames per second while idle. Input is picked up
+                        at this rate, so it is low but not so low as to feel sluggish
+                        max_ticks - most ticks run in one frame. After a long stall
+                        (a breakpoint, the window being dragged) the simulation falls
+                        behind instead of spending ever longer catching up
+                        clock - the pygame.time.Clock pacing the frames
+                        ticks, frames, idle_frames - counts so far
+                        running - set to False, or call stop(), to leave run()
+
+        : methods:      run() - loop until stopped
+                        run_frame() - one frame: the ticks due, then a draw unless idle.
+                        Returns whether it drew
+                        mark_dirty() - draw the next frame even if get_state() hasn't
+                        changed, e.g. when the window is uncovered
+                        stop()
+    '''
+
+    def __init__(self, update, render, get_state=None, tick_rate=TICK_RATE, max_fps=MAX_FPS,
+                 idle_fps=IDLE_FPS, vsync=False, max_ticks=MAX_TICKS_PER_FRAME, clock=None):
+        self.update = update
+        self.render = render
+        self.get_state = get_state
+        self.tick_rate = tick_rate
+        self.tick_seconds = 1/tick_rate
+        self.max_fps = 0 if vsync else max_fps
+        self.idle_fps = idle_fps
+        self.max_ticks = max_ticks
+        self.clock = clock if clock is not None else pygame.time.Clock()
+        self.accumulator = 0
+        self.alpha = 0
+        self.drawn_state = None
+        self.dirty = True
+        self.idle = False
+        self.ticks = 0
+        self.frames = 0
+        self.idle_frames = 0
+        self.running = False
+
+
+    def mark_dirty(self):
+        self.dirty = True
+
+
+    def stop(self):
+        self.running = False
+
+
+    def run(self):
+        self.running = True
+        while self.running:
+            self.run_frame()
+
+
+    def run_frame(self):
+        # clock.tick() sleeps off what is left of the frame and returns the
+        # milliseconds since the last call. The time owed to the simulation is kept
+        # in thousandths of a tick, whole numbers, so no rounding ever adds or drops a tick
+        elapsed = self.clock.tick(self.idle_fps if self.idle else self.max_fps)
+        self.accumulator += min(elapsed*self.tick_rate, self.max_ticks*1000)
+        with profiler_class.PROFILER.scope('update'):
+            while self.accumulator >= 1000:
+                self.update(self.tick_seconds)
+                self.accumulator -= 1000
+                self.ticks += 1
+        self.alpha = self.accumulator/1000
+
+        state = self.get_state() if self.get_state is not None else None
+        self.idle = not self.dirty and self.get_state is not None and state == self.drawn_state
+        self.frames += 1
+        if self.idle:
+            self.idle_frames += 1
+            return False
+        self.render(self.alpha)
+        self.drawn_state = state
+        self.dirty = False
+        return True
+
+
+class FakeClock():
+    ''' Stands in for pygame.time.Clock: every tick() takes frame_ms, recording the cap asked for '''
+    def __init__(self, frame_ms):
+        self.frame_ms = frame_ms
+        self.caps = []
+
+    def tick(self, framerate=0):
+        self.caps.append(framerate)
+        return self.frame_ms
+
+
+class TestGameLoop(unittest.TestCase):
+    def test_fixed_ticks(self):
+        updates, alphas = [], []
+        # 25 ms frames against 20 ms ticks: 5 ticks every 4 frames
+        loop = GameLoop(updates.append, alphas.append, tick_rate=50, clock=FakeClock(25))
+        for i in range(8):
+            loop.run_frame()
+        self.assertEqual(len(updates), 10)
+        self.assertTrue(all(dt == 1/50 for dt in updates))
+        self.assertEqual(alphas[:4], [0.25, 0.5, 0.75, 0.0])
+        self.assertEqual(interpolate(10, 20, alphas[0]), 12.5)
+
+    def test_long_stall(self):
+        updates = []
+        loop = GameLoop(updates.append, lambda alpha: None, tick_rate=50, max_ticks=5, clock=FakeClock(2000))
+        loop.run_frame()
+        self.assertEqual(len(updates), 5, "A stall shouldn't be caught up on all at once")
+
+    def test_idle(self):
+        state = [0]
+        renders = []
+        clock = FakeClock(16)
+        loop = GameLoop(lambda dt: None, renders.append, lambda: state[0],
+                        max_fps=60, idle_fps=10, clock=clock)
+        self.assertTrue(loop.run_frame())
+        self.assertFalse(loop.run_frame())
+        self.assertFalse(loop.run_frame())
+        state[0] = 1
+        self.assertTrue(loop.run_frame())
+        loop.mark_dirty()
+        self.assertTrue(loop.run_frame())
+        self.assertFalse(loop.run_frame())
+        self.assertEqual((len(renders), loop.idle_frames), (3, 3))
+        # drawing frames are capped at max_fps, idle ones slow down to idle_fps
+        self.assertEqual(clock.caps, [60, 60, 10, 10, 60, 60])
+
+    def test_vsync(self):
+        clock = FakeClock(16)
+        loop = GameLoop(lambda dt: None, lambda alpha: None, vsync=True, clock=clock)
+        loop.run_frame()
+        self.assertEqual(clock.caps, [0], "With vsync the flip paces the frames, not the clock")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+#
+# grid_class - the size of the tile grid, picked at runtime, with the
+#              neighbours of every tile worked out once and kept in a table
+#
+
+import array
+import unittest
+import numpy
+from game_constants import *
+
+# (column, row) steps to the neighbours of a tile, in the order they are listed.
+# Rows count up the map, so north is +1 row (+tiles in tile numbers)
+CARDINAL_STEPS = [(0, 1), (1, 0), (0, -1), (-1, 0)]                 # N, E, S, W
+DIAGONAL_STEPS = [(1, 1), (1, -1), (-1, -1), (-1, 1)]               # NE, SE, SW, NW
+
+
+class Grid():
+    ''' Grid class : a square grid of tiles numbered 1 to tiles*tiles, from the
+                     bottom left corner, east along a row and then north a row at a time
+
+        : attributes:   tiles - number of tiles along a side
+                        tile_count - tiles*tiles
+                        cols, rows - numpy arrays of each tile's column and row (slot 0 unused)
+                        indptr, indices - the neighbour table in CSR form: the neighbours
+                        of tile_no are indices[indptr[tile_no]:indptr[tile_no+1]],
+                        N, E, S, W, skipping the ones off the grid
+                        diagonal_indptr, diagonal_indices - the same for 8 neighbours,
+                        N, E, S, W, NE, SE, SW, NW, built the first time they are asked for
+
+        : methods:      get_surrounding_tiles(tile_no) - the 4 neighbours, a table read
+                        get_diagonal_surrounding_tiles(tile_no) - the 8 neighbours
+                        get_corner_tiles(tile_no, next_no) - the tiles either side of a
+                        diagonal step, for corner cutting checks
+                        get_col_row(tile_no) / get_tile_no(col, row) - convert between the
+                        two, get_tile_no gives 0 off the grid
+
+        Use get_grid(tiles) to share one Grid (and its tables) per size.
+    '''
+
+    def __init__(self, tiles=TILES):
+        self.tiles = tiles
+        self.tile_count = tiles*tiles
+        tile_nos = numpy.arange(self.tile_count + 1)
+        self.cols = (tile_nos-1) % tiles
+        self.rows = (tile_nos-1) // tiles
+        self.indptr, self.indices = self.build_neighbours(CARDINAL_STEPS)
+        # plain arrays slice and iterate much faster than numpy ones in the search loops
+        self.starts = array.array('q', self.indptr.tobytes())
+        self.table = array.array('i', self.indices.tobytes())
+        self.diagonal_indptr = None
+        self.diagonal_indices = None
+
+
+    def build_neighbours(self, steps):
+        ''' CSR table of the neighbours of every tile, in the order of steps '''
+        tiles = self.tiles
+        cols, rows = self.cols[1:], self.rows[1:]
+        neighbours = numpy.zeros((self.tile_count, len(steps)), dtype=numpy.int32)
+        on_grid = numpy.zeros((self.tile_count, len(steps)), dtype=bool)
+        for i, (col_step, row_step) in enumerate(steps):
+            next_cols, next_rows = cols + col_step, rows + row_step
+            on_grid[:, i] = (next_cols >= 0) & (next_cols < tiles) & (next_rows >= 0) & (next_rows < tiles)
+            neighbours[:, i] = next_rows*tiles + next_cols + 1
+        indptr = numpy.zeros(self.tile_count + 2, dtype=numpy.int64)
+        indptr[2:] = numpy.cumsum(on_grid.sum(axis=1))
+        return indptr, neighbours[on_grid]
+
+
+    def build_diagonal_neighbours(self):
+        self.diagonal_indptr, self.diagonal_indices = self.build_neighbours(CARDINAL_STEPS + DIAGONAL_STEPS)
+        self.diagonal_starts = array.array('q', self.diagonal_indptr.tobytes())
+        self.diagonal_table = array.array('i', self.diagonal_indices.tobytes())
+
+
+    def get_surrounding_tiles(self, tile_no):
+        starts = self.starts
+        return self.table[starts[tile_no]:starts[tile_no+1]]
+
+
+    def get_diagonal_surrounding_tiles(self, tile_no):
+        if self.diagonal_indptr is None:
+            self.build_diagonal_neighbours()
+        starts = self.diagonal_starts
+        return self.diagonal_table[starts[tile_no]:starts[tile_no+1]]
+
+
+    def is_diagonal(self, tile_no, next_no):
+        return next_no - tile_no not in (1, -1, self.tiles, -self.tiles)
+
+
+    def get_corner_tiles(self, tile_no, next_no):
+        ''' The two tiles a diagonal step from tile_no to next_no passes between '''
+        col_step = (next_no-1) % self.tiles - (tile_no-1) % self.tiles
+        return (tile_no + col_step, next_no - col_step)
+
+
+    def get_col_row(self, tile_no):
+        return ((tile_no-1) % self.tiles, (tile_no-1) // self.tiles)
+
+
+    def get_tile_no(self, col, row):
+        if 0 <= col < self.tiles and 0 <= row < self.tiles:
+            return row*self.tiles + col + 1
+        return 0
+
+
+GRIDS = {}
+
+def get_grid(tiles=TILES):
+    ''' The shared Grid for maps of tiles x tiles '''
+    grid = GRIDS.get(tiles)
+    if grid is None:
+        grid = GRIDS[tiles] = Grid(tiles)
+    return grid
+
+
+class TestGrid(unittest.TestCase):
+    def test_neighbours(self):
+        grid = Grid(10)
+        self.assertEqual(list(grid.get_surrounding_tiles(1)), [11, 2])
+        self.assertEqual(list(grid.get_surrounding_tiles(5)), [15, 6, 4])
+        self.assertEqual(list(grid.get_surrounding_tiles(55)), [65, 56, 45, 54])
+        self.assertEqual(list(grid.get_surrounding_tiles(11)), [21, 12, 1])
+        self.assertEqual(list(grid.get_surrounding_tiles(100)), [90, 99])
+        self.assertEqual(list(grid.get_diagonal_surrounding_tiles(1)), [11, 2, 12])
+        self.assertEqual(list(grid.get_diagonal_surrounding_tiles(55)), [65, 56, 45, 54, 66, 46, 44, 64])
+        self.assertEqual(len(grid.indices), 4*10*10 - 4*10)
+        self.assertEqual(grid.get_corner_tiles(55, 66), (56, 65))
+        self.assertEqual(grid.get_corner_tiles(55, 44), (54, 45))
+        self.assertEqual((grid.is_diagonal(55, 64), grid.is_diagonal(55, 45)), (True, False))
+
+    def test_conversions(self):
+        grid = get_grid(7)
+        self.assertIs(get_grid(7), grid)
+        for tile_no in (1, 7, 8, 49):
+            self.assertEqual(grid.get_tile_no(*grid.get_col_row(tile_no)), tile_no)
+        self.assertEqual(grid.get_tile_no(7, 0), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,298 @@
+#
+# grid_search_class - A Star search over the tile grid, with all of the
+#                     search state kept in numpy arrays instead of on the tiles
+#
+
+import heapq
+import time
+import unittest
+import numpy
+from game_constants import *
+import grid_class
+import profiler_class
+
+
+class GridSearch():
+    ''' GridSearch class : the same search as A_Star(use_heap=True), but the map
+                           is held as a walkability array indexed by tile number,
+                           so it never touches the Tile objects while searching
+
+        : attributes:   grid - the Grid searched over, grid_class.get_grid(tiles) by default
+                        tiles - number of tiles along a side of the (square) grid
+                        walkability - numpy array, walkability[tile_no] (slot 0 unused)
+                        min_walkability - no tile is cheaper than this. The hval of a tile
+                        is 10*min_walkability per step to the target, so raising it
+                        to match a grid with no roads makes the search far more direct.
+                        Defaults to the road walkability, the cheapest tile type
+                        gval, parent - per-search scratch arrays, indexed by tile number
+                        seen, closed - generation stamps. A tile's gval/parent only
+                        count if seen[tile_no] == generation, and it is closed if
+                        closed[tile_no] == generation, so reset() just bumps the
+                        generation instead of clearing every array
+                        diagonal - when True tiles have 8 neighbours, as A_Star(diagonal=True):
+                        diagonal steps cost 14*walkability, may not cut the corner of a
+                        tile with walkability CORNER_WALKABILITY or more, and the hval is
+                        the octile distance
+                        nodes_expanded - tiles closed by the last search
+                        open_heap, best_tile - the open list of the search in progress and
+                        its closed tile nearest the target, see continue_search()
+
+        : methods:      load_tiles(tile_dict) - copy the walkability of the map tiles
+                        search(start, target) - run the search, returns target or 0
+                        begin_search(start, target), continue_search(budget) - the same
+                        search run a slice at a time
+                        get_path() - list of tile numbers from target back to start
+                        reset() - forget the last search, O(1)
+    '''
+
+    def __init__(self, tiles=TILES, walkability=None, grid=None, diagonal=False):
+        self.grid = grid if grid is not None else grid_class.get_grid(tiles)
+        tiles = self.tiles = self.grid.tiles
+        size = tiles*tiles + 1
+        self.walkability = numpy.ones(size, dtype=numpy.int64)
+        if walkability is not None:
+            self.walkability[1:] = walkability
+        self.gval = numpy.zeros(size, dtype=numpy.int64)
+        self.parent = numpy.zeros(size, dtype=numpy.int64)
+        self.seen = numpy.zeros(size, dtype=numpy.uint32)
+        self.closed = numpy.zeros(size, dtype=numpy.uint32)
+        self.generation = 0
+        self.min_walkability = TILE_WALKABILITY['road']
+        self.diagonal = diagonal
+
+        self.cols = self.grid.cols
+        self.rows = self.grid.rows
+
+        self.start = 0
+        self.target = 0
+        self.nodes_expanded = 0
+        self.open_heap = []
+        self.best_tile = 0
+        self.best_hval = None
+
+
+    def load_tiles(self, tile_dict):
+        ''' Copy the walkability of every tile in tile_dict into the grid '''
+        for tile_no, tile in tile_dict.items():
+            self.walkability[tile_no] = tile.walkability
+
+
+    def hvals(self, target):
+        ''' Manhattan (or octile) distance from every tile to target, in one vectorized pass '''
+        dx = numpy.abs(self.cols - self.cols[target])
+        dy = numpy.abs(self.rows - self.rows[target])
+        if self.diagonal:
+            return self.min_walkability*(10*numpy.maximum(dx, dy) + 4*numpy.minimum(dx, dy))
+        return 10*self.min_walkability*(dx + dy)
+
+
+    def get_hval(self, tile_no):
+        ''' hvals() for a single tile, against the current target '''
+        tiles, target = self.tiles, self.target
+        dx = abs((target-1) % tiles - (tile_no-1) % tiles)
+        dy = abs((target-1) // tiles - (tile_no-1) // tiles)
+        if self.diagonal:
+            return self.min_walkability*(10*max(dx, dy) + 4*min(dx, dy))
+        return 10*self.min_walkability*(dx + dy)
+
+
+    def get_surrounding_tiles(self, tile_no):
+        if self.diagonal:
+            return self.grid.get_diagonal_surrounding_tiles(tile_no)
+        return self.grid.get_surrounding_tiles(tile_no)
+
+
+    def get_step_cost(self, tile_no, next_no):
+        ''' Cost of stepping from tile_no onto next_no, None if the step cuts a corner '''
+        walkability = int(self.walkability[next_no])
+        if not self.grid.is_diagonal(tile_no, next_no):
+            return 10*walkability
+        for side in self.grid.get_corner_tiles(tile_no, next_no):
+            if self.walkability[side] >= CORNER_WALKABILITY:
+                return None
+        return 14*walkability
+
+
+    def reset(self):
+        self.generation += 1
+        if self.generation > numpy.iinfo(numpy.uint32).max:
+            self.seen.fill(0)
+            self.closed.fill(0)
+            self.generation = 1
+        self.start = 0
+        self.target = 0
+        self.nodes_expanded = 0
+
+
+    def search(self, start, target, max_expansions=None):
+        ''' Search from start to target. Returns the target, or 0 when there is no
+            path or max_expansions tiles were expanded first '''
+        found = self.run_search(start, target, max_expansions)
+        profiler_class.PROFILER.count('astar_nodes', self.nodes_expanded)
+        return found
+
+
+    def run_search(self, start, target, max_expansions=None):
+        self.begin_search(start, target)
+        return self.continue_search(max_expansions) or 0
+
+
+    def begin_search(self, start, target):
+        ''' Set up a search from start to target for continue_search() to run '''
+        self.reset()
+        self.start = start
+        self.target = target
+        self.seen[start] = self.generation
+        self.gval[start] = 0
+        self.parent[start] = 0
+        hval = self.get_hval(start)
+        self.open_heap = [(hval, hval, start)]
+        self.best_tile = start
+        self.best_hval = None
+
+
+    def continue_search(self, max_expansions=None, deadline=None):
+        ''' Carry on the search set up by begin_search(), for at most max_expansions
+            more tiles or until time.perf_counter() passes deadline. Returns the
+            target once it is reached, 0 when there is no path, or None when the
+            budget ran out first, in which case calling again picks up where it stopped.
+            The deadline is checked every 16 tiles, after the first 16 of the call, so
+            every call gets somewhere however small its budget.
+            best_tile is the closed tile closest to the target so far (lowest hval) '''
+        target = self.target
+        generation = self.generation
+        walkability, gval, parent = self.walkability, self.gval, self.parent
+        seen, closed = self.seen, self.closed
+        tiles = self.tiles
+        targetx, targety = (target-1) % tiles, (target-1) // tiles
+        hval_step = 10*self.min_walkability
+        diagonal = self.diagonal
+        diagonal_hval_step = 4*self.min_walkability
+        get_surrounding_tiles = self.get_surrounding_tiles
+        open_heap = self.open_heap
+        slice_start = self.nodes_expanded
+        if max_expansions is not None:
+            max_expansions += slice_start
+        best_hval = self.best_hval
+
+        while open_heap:
+            fval, hval, tile_no = heapq.heappop(open_heap)
+            if closed[tile_no] == generation or fval - hval != gval[tile_no]:
+                continue
+            if tile_no == target:
+                self.best_tile = target
+                return target
+            if ((max_expansions is not None and self.nodes_expanded >= max_expansions) or
+                    (deadline is not None and self.nodes_expanded - slice_start >= 16 and
+                     (self.nodes_expanded - slice_start) % 16 == 0 and time.perf_counter() > deadline)):
+                heapq.heappush(open_heap, (fval, hval, tile_no))
+                return None
+            closed[tile_no] = generation
+            self.nodes_expanded += 1
+            if best_hval is None or hval < best_hval:
+                best_hval = self.best_hval = hval
+                self.best_tile = tile_no
+            cur_gval = int(gval[tile_no])
+            for next_no in get_surrounding_tiles(tile_no):
+                if closed[next_no] == generation:
+                    continue
+                step = next_no - tile_no
+                if step == 1 or step == -1 or step == tiles or step == -tiles:
+                    next_gval = cur_gval + 10*int(walkability[next_no])
+                else:
+                    # diagonal: the two tiles it passes between are tile_no + col_step and next_no - col_step
+                    col_step = 1 if step == tiles+1 or step == 1-tiles else -1
+                    if (walkability[tile_no + col_step] >= CORNER_WALKABILITY or
+                            walkability[next_no - col_step] >= CORNER_WALKABILITY):
+                        continue
+                    next_gval = cur_gval + 14*int(walkability[next_no])
+                if seen[next_no] == generation and next_gval >= gval[next_no]:
+                    continue
+                seen[next_no] = generation
+                gval[next_no] = next_gval
+                parent[next_no] = tile_no
+                dx, dy = abs(targetx - (next_no-1) % tiles), abs(targety - (next_no-1) // tiles)
+                if diagonal:
+                    next_hval = hval_step*max(dx, dy) + diagonal_hval_step*min(dx, dy)
+                else:
+                    next_hval = hval_step*(dx + dy)
+                heapq.heappush(open_heap, (next_gval + next_hval, next_hval, next_no))
+        return 0
+
+
+    def get_path(self, tile_no=None):
+        ''' Tile numbers from tile_no (the target by default) back to start '''
+        path_list = []
+        if tile_no is None:
+            tile_no = self.target
+        while tile_no != self.start:
+            path_list.append(tile_no)
+            tile_no = int(self.parent[tile_no])
+        path_list.append(self.start)
+        return path_list
+
+
+    def get_cost(self, path_list):
+        ''' Total cost of walking path_list, as used by the search '''
+        if not self.diagonal:
+            return 10*int(self.walkability[path_list[:-1]].sum())
+        return sum(self.get_step_cost(path_list[i+1], path_list[i]) for i in range(len(path_list)-1))
+
+
+class TestGridSearch(unittest.TestCase):
+    def setUp(self):
+        import map_class
+        self.test_map = map_class.LevelMap(headless=True)
+        self.test_map.map_creator()
+        self.tile_dict = self.test_map.return_dict_of_tiles()
+        self.test_search = GridSearch()
+        self.test_search.load_tiles(self.tile_dict)
+
+    def test_matches_heap_astar(self):
+        import a_star_class
+        heap_astar = a_star_class.A_Star(use_heap=True)
+        for start, target in ((1, TILES*TILES), (TILES, TILES*(TILES-1) + 1), (TILES*TILES//2, 1)):
+            heap_astar.init_AStar(self.tile_dict, start, target)
+            heap_astar.run_AStar(start)
+            astar_gval = self.tile_dict[target].gval
+            heap_astar.reset()
+
+            self.assertEqual(self.test_search.search(start, target), target)
+            path_list = self.test_search.get_path()
+            self.assertEqual((path_list[0], path_list[-1]), (target, start))
+            self.assertEqual(self.test_search.get_cost(path_list), astar_gval,
+                                "GridSearch path from {0} to {1} is not as cheap as A_Star's".format(start, target))
+
+    def test_reset_between_searches(self):
+        self.test_search.walkability[1:] = 1
+        self.test_search.search(1, TILES*TILES)
+        self.test_search.search(10, 1)
+        self.assertEqual(self.test_search.get_path(), [1,2,3,4,5,6,7,8,9,10],
+                            "GridSearch doesn't return accurate path, going from 10 to 1")
+        self.assertEqual(list(self.test_search.hvals(1)[1:4]), [0, 10, 20])
+
+    def test_diagonal_matches_astar(self):
+        import a_star_class
+        diagonal_search = GridSearch(diagonal=True)
+        diagonal_search.load_tiles(self.tile_dict)
+        diagonal_astar = a_star_class.A_Star(use_heap=True, diagonal=True)
+        for start, target in ((1, TILES*TILES), (TILES, TILES*(TILES-1) + 1), (TILES*TILES//2, 1)):
+            diagonal_astar.init_AStar(self.tile_dict, start, target)
+            diagonal_astar.run_AStar(start)
+            astar_gval = self.tile_dict[target].gval
+            diagonal_astar.reset()
+
+            self.assertEqual(diagonal_search.search(start, target), target)
+            self.assertEqual(diagonal_search.get_cost(diagonal_search.get_path()), astar_gval)
+
+        # on open ground the diagonal search goes straight across
+        diagonal_search.walkability[1:] = 1
+        self.test_search.walkability[1:] = 1
+        diagonal_search.search(1, TILES*TILES)
+        self.test_search.search(1, TILES*TILES)
+        self.assertEqual(len(diagonal_search.get_path()), TILES)
+        self.assertTrue(diagonal_search.nodes_expanded < self.test_search.nodes_expanded)
+
+
+if __name__ == '__main__':
+    unittest.main()
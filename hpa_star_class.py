@@ -0,0 +1,313 @@
+#
+# hpa_star_class - hierarchical path finding. The map is cut into square
+#                  clusters, the search runs over the few entrance tiles on the
+#                  cluster borders, and only then is the path filled in tile by tile
+#
+
+import heapq
+import unittest
+from game_constants import *
+
+CLUSTER_TILES = 10
+INFINITY = float('inf')
+
+
+class HPAStar():
+    ''' HPAStar class : abstract graph of cluster entrances over a GridSearch grid
+
+        : attributes:   grid - GridSearch giving the tiles' walkability and neighbours
+                        cluster_tiles - tiles along a side of a cluster
+                        entrance_spacing - every border gets one entrance per this
+                        many tiles, at the cheapest crossing in that stretch
+                        borders - (cluster, 'east'/'north'): list of (tile, tile) pairs
+                        crossing from cluster to its east/north neighbour
+                        cluster_nodes - cluster: set of its entrance tiles
+                        edges - entrance tile: {tile: cost} for the abstract graph, both
+                        across a border and through the cluster
+                        nodes_expanded - abstract nodes expanded by the last search
+                        clusters_rebuilt - number of times a cluster's edges were worked out
+
+        : methods:      find_abstract_path(start, target) - start, entrances..., target
+                        refine(abstract_path) - yields the tiles of each leg in turn, so
+                        only the legs that are used need searching
+                        find_path(start, target) - the whole path, start first
+                        update_tiles(tile_nos) - redo the entrances and edges of the
+                        clusters holding tile_nos and of the clusters next to them
+
+        Costs are the ones GridSearch uses: stepping onto a tile costs 10 times its
+        walkability. Paths are close to, but not always, the cheapest.
+    '''
+
+    def __init__(self, grid, cluster_tiles=CLUSTER_TILES, entrance_spacing=None):
+        self.grid = grid
+        self.cluster_tiles = cluster_tiles
+        if entrance_spacing is None:
+            entrance_spacing = max((cluster_tiles+1) // 2, 1)
+        self.entrance_spacing = entrance_spacing
+        self.clusters = (grid.tiles + cluster_tiles - 1) // cluster_tiles
+        self.borders = {}
+        self.cluster_nodes = {}
+        self.edges = {}
+        self.nodes_expanded = 0
+        self.clusters_rebuilt = 0
+        self.build()
+
+
+    def get_cluster(self, tile_no):
+        tiles = self.grid.tiles
+        return (((tile_no-1) % tiles) // self.cluster_tiles, ((tile_no-1) // tiles) // self.cluster_tiles)
+
+
+    def get_cluster_bounds(self, cluster):
+        ''' (first_col, last_col, first_row, last_row) of the tiles in cluster '''
+        first_col, first_row = cluster[0]*self.cluster_tiles, cluster[1]*self.cluster_tiles
+        return (first_col, min(first_col + self.cluster_tiles, self.grid.tiles) - 1,
+                first_row, min(first_row + self.cluster_tiles, self.grid.tiles) - 1)
+
+
+    def get_neighbour_clusters(self, cluster):
+        ccol, crow = cluster
+        return [(col, row) for col, row in ((ccol+1, crow), (ccol-1, crow), (ccol, crow+1), (ccol, crow-1))
+                if 0 <= col < self.clusters and 0 <= row < self.clusters]
+
+
+    def get_cluster_borders(self, cluster):
+        ''' Keys of self.borders for the (up to four) borders around cluster '''
+        ccol, crow = cluster
+        borders = []
+        if ccol < self.clusters-1:
+            borders.append((cluster, 'east'))
+        if crow < self.clusters-1:
+            borders.append((cluster, 'north'))
+        if ccol > 0:
+            borders.append(((ccol-1, crow), 'east'))
+        if crow > 0:
+            borders.append(((ccol, crow-1), 'north'))
+        return borders
+
+
+    def find_entrances(self, border):
+        ''' Pick the crossings of border: the cheapest pair of tiles to step
+            between in every stretch of entrance_spacing tiles '''
+        cluster, direction = border
+        first_col, last_col, first_row, last_row = self.get_cluster_bounds(cluster)
+        tiles = self.grid.tiles
+        if direction == 'east':
+            pairs = [(row*tiles + last_col + 1, row*tiles + last_col + 2)
+                     for row in range(first_row, last_row+1)]
+        else:
+            pairs = [(last_row*tiles + col + 1, (last_row+1)*tiles + col + 1)
+                     for col in range(first_col, last_col+1)]
+
+        walkability = self.grid.walkability
+        entrances = []
+        for first in range(0, len(pairs), self.entrance_spacing):
+            stretch = pairs[first:first + self.entrance_spacing]
+            middle = (len(stretch)-1) / 2.0
+            best = min(range(len(stretch)),
+                       key=lambda i: (int(walkability[stretch[i][0]]) + int(walkability[stretch[i][1]]),
+                                      abs(i - middle), i))
+            entrances.append(stretch[best])
+        return entrances
+
+
+    def search_cluster(self, source, cluster, reverse=False, goal=0):
+        ''' Dijkstra from source over the tiles of cluster only. Returns (cost, parent)
+            dicts. With reverse, cost is the cost of getting from each tile to source
+            instead of from source to each tile. Stops early once goal is reached '''
+        first_col, last_col, first_row, last_row = self.get_cluster_bounds(cluster)
+        tiles = self.grid.tiles
+        walkability = self.grid.walkability
+        cost = {source: 0}
+        parent = {source: 0}
+        done = set()
+        open_heap = [(0, source)]
+        while open_heap:
+            tile_cost, tile_no = heapq.heappop(open_heap)
+            if tile_no in done:
+                continue
+            done.add(tile_no)
+            if tile_no == goal:
+                break
+            step_cost = 10*int(walkability[tile_no])
+            for next_no in self.grid.get_surrounding_tiles(tile_no):
+                if next_no in done:
+                    continue
+                col, row = (next_no-1) % tiles, (next_no-1) // tiles
+                if not (first_col <= col <= last_col and first_row <= row <= last_row):
+                    continue
+                next_cost = tile_cost + (step_cost if reverse else 10*int(walkability[next_no]))
+                if next_cost < cost.get(next_no, INFINITY):
+                    cost[next_no] = next_cost
+                    parent[next_no] = tile_no
+                    heapq.heappush(open_heap, (next_cost, next_no))
+        return cost, parent
+
+
+    def build_cluster(self, cluster):
+        ''' Work out the entrance tiles of cluster and all of their edges, from the
+            entrances currently in self.borders '''
+        for tile_no in self.cluster_nodes.get(cluster, ()):
+            self.edges.pop(tile_no, None)
+        walkability = self.grid.walkability
+        nodes = set()
+        crossings = []
+        for border in self.get_cluster_borders(cluster):
+            for pair in self.borders[border]:
+                for tile_no, other_no in (pair, pair[::-1]):
+                    if self.get_cluster(tile_no) == cluster:
+                        nodes.add(tile_no)
+                        crossings.append((tile_no, other_no))
+        self.cluster_nodes[cluster] = nodes
+
+        for tile_no in nodes:
+            cost, parent = self.search_cluster(tile_no, cluster)
+            self.edges[tile_no] = {other_no: cost[other_no] for other_no in nodes if other_no != tile_no}
+        for tile_no, other_no in crossings:
+            self.edges[tile_no][other_no] = 10*int(walkability[other_no])
+        self.clusters_rebuilt += 1
+
+
+    def build(self):
+        self.borders = {}
+        self.cluster_nodes = {}
+        self.edges = {}
+        all_clusters = [(col, row) for row in range(self.clusters) for col in range(self.clusters)]
+        for cluster in all_clusters:
+            for border in self.get_cluster_borders(cluster):
+                if border[0] == cluster:
+                    self.borders[border] = self.find_entrances(border)
+        for cluster in all_clusters:
+            self.build_cluster(cluster)
+
+
+    def update_tiles(self, tile_nos):
+        ''' The walkability of tile_nos changed. Their clusters' borders get new
+            entrances, and the clusters on both sides of those borders new edges '''
+        changed = set(self.get_cluster(tile_no) for tile_no in tile_nos)
+        for cluster in changed:
+            for border in self.get_cluster_borders(cluster):
+                self.borders[border] = self.find_entrances(border)
+        rebuild = set(changed)
+        for cluster in changed:
+            rebuild.update(self.get_neighbour_clusters(cluster))
+        for cluster in rebuild:
+            self.build_cluster(cluster)
+
+
+    def get_hval(self, tile_no, target):
+        tiles = self.grid.tiles
+        return 10*(abs((tile_no-1) % tiles - (target-1) % tiles) +
+                   abs((tile_no-1) // tiles - (target-1) // tiles))
+
+
+    def find_abstract_path(self, start, target):
+        ''' The entrances a path from start to target goes through, with start and
+            target at either end, or [] if there is no path '''
+        self.nodes_expanded = 0
+        if start == target:
+            return [start]
+        start_cluster, target_cluster = self.get_cluster(start), self.get_cluster(target)
+        # hook start and target into the abstract graph for this search only
+        start_costs, parent = self.search_cluster(start, start_cluster)
+        start_edges = {tile_no: start_costs[tile_no] for tile_no in self.cluster_nodes[start_cluster]
+                       if tile_no in start_costs and tile_no != start}
+        target_costs, parent = self.search_cluster(target, target_cluster, reverse=True)
+        to_target = {tile_no: target_costs[tile_no] for tile_no in self.cluster_nodes[target_cluster]
+                     if tile_no in target_costs}
+        if start_cluster == target_cluster:
+            start_edges[target] = target_costs[start]
+
+        gval = {start: 0}
+        parent = {start: 0}
+        closed = set()
+        open_heap = [(self.get_hval(start, target), start)]
+        while open_heap:
+            fval, tile_no = heapq.heappop(open_heap)
+            if tile_no in closed:
+                continue
+            if tile_no == target:
+                break
+            closed.add(tile_no)
+            self.nodes_expanded += 1
+            edges = dict(self.edges.get(tile_no, {}))
+            if tile_no == start:
+                edges.update(start_edges)
+            if tile_no in to_target:
+                edges[target] = min(to_target[tile_no], edges.get(target, INFINITY))
+            for next_no, edge_cost in edges.items():
+                next_gval = gval[tile_no] + edge_cost
+                if next_no not in closed and next_gval < gval.get(next_no, INFINITY):
+                    gval[next_no] = next_gval
+                    parent[next_no] = tile_no
+                    heapq.heappush(open_heap, (next_gval + self.get_hval(next_no, target), next_no))
+
+        if target not in gval:
+            return []
+        abstract_path = [target]
+        while abstract_path[-1] != start:
+            abstract_path.append(parent[abstract_path[-1]])
+        abstract_path.reverse()
+        return abstract_path
+
+
+    def refine(self, abstract_path):
+        ''' Yield the tiles of each leg of abstract_path, without the tile the leg
+            starts from, searching the cluster it crosses only when it is reached '''
+        for tile_no, next_no in zip(abstract_path, abstract_path[1:]):
+            cluster = self.get_cluster(tile_no)
+            if self.get_cluster(next_no) != cluster:
+                yield [next_no]
+                continue
+            cost, parent = self.search_cluster(tile_no, cluster, goal=next_no)
+            leg = [next_no]
+            while leg[-1] != tile_no:
+                leg.append(parent[leg[-1]])
+            leg.pop()
+            leg.reverse()
+            yield leg
+
+
+    def find_path(self, start, target):
+        abstract_path = self.find_abstract_path(start, target)
+        if not abstract_path:
+            return []
+        path_list = [start]
+        for leg in self.refine(abstract_path):
+            path_list += leg
+        return path_list
+
+
+class TestHPAStar(unittest.TestCase):
+    def setUp(self):
+        import map_class
+        self.test_map = map_class.LevelMap(headless=True)
+        self.test_map.map_creator()
+        self.grid = self.test_map.get_grid_search()
+        self.hpa = HPAStar(self.grid, cluster_tiles=4)
+
+    def test_paths(self):
+        for start, target in ((1, TILES*TILES), (TILES, TILES*(TILES-1) + 1), (2, TILES+3), (7, 7)):
+            path = self.hpa.find_path(start, target)
+            self.assertEqual((path[0], path[-1]), (start, target))
+            for tile_no, next_no in zip(path, path[1:]):
+                self.assertTrue(next_no in self.grid.get_surrounding_tiles(tile_no),
+                                    "HPA* path from {0} to {1} jumps from {2} to {3}".format(start, target, tile_no, next_no))
+            if start != target:
+                self.grid.search(start, target)
+                self.assertTrue(self.grid.get_cost(path[::-1]) >= self.grid.get_cost(self.grid.get_path()))
+
+    def test_local_update(self):
+        rebuilt = self.hpa.clusters_rebuilt
+        self.test_map.set_tile_type(TILES+2, 'road')
+        self.test_map.set_tile_type(TILES+3, 'city')
+        self.hpa.update_tiles([TILES+2, TILES+3])
+        self.assertTrue(self.hpa.clusters_rebuilt - rebuilt <= 3,
+                            "Only the changed cluster and its neighbours should be rebuilt")
+        fresh = HPAStar(self.grid, cluster_tiles=4)
+        self.assertEqual(self.hpa.borders, fresh.borders)
+        self.assertEqual(self.hpa.edges, fresh.edges)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,327 @@
+#
+# jump_point_class - Jump Point Search over the tile grid: straight runs of
+#                    tiles that no cheapest path needs to turn off are skipped
+#                    over instead of expanded one tile at a time
+#
+
+import heapq
+import unittest
+import numpy
+from game_constants import *
+import map_generator_class
+import grid_search_class
+
+# mask bit and (column, row) step of each direction
+NORTH, EAST, SOUTH, WEST = 1, 2, 4, 8
+ALL_DIRECTIONS = NORTH | EAST | SOUTH | WEST
+ALL_BITS = (NORTH, EAST, SOUTH, WEST)
+DIRECTIONS = [(NORTH, 0, 1), (EAST, 1, 0), (SOUTH, 0, -1), (WEST, -1, 0)]
+DIRECTION_BITS = {(0, 1): NORTH, (1, 0): EAST, (0, -1): SOUTH, (-1, 0): WEST}
+
+
+def next_along(points, forward):
+    ''' For every cell of the 2D bool array points, the column of the nearest True
+        cell strictly after it in its row (forward) or before it, -1 if there is none '''
+    size = points.shape[1]
+    if not forward:
+        nearest = next_along(points[:, ::-1], True)[:, ::-1]
+        return numpy.where(nearest >= 0, size-1 - nearest, -1)
+    found = numpy.where(points, numpy.arange(size), size)
+    found = numpy.minimum.accumulate(found[:, ::-1], axis=1)[:, ::-1]     # nearest at or after
+    nearest = numpy.full(points.shape, -1)
+    nearest[:, :-1] = numpy.where(found[:, 1:] < size, found[:, 1:], -1)
+    return nearest
+
+
+class JumpPointSearch(grid_search_class.GridSearch):
+    ''' JumpPointSearch class : finds the same cheapest paths as GridSearch, but only
+                                expands the tiles where a cheapest path may turn
+
+        Of two equally cheap paths the one that moves east/west first is kept. A
+        tile reached going north/south is then only worth turning off at if the tile
+        beside the one before it costs more than it does (otherwise turning a tile
+        earlier is no dearer), and a tile reached going east/west only if the tile
+        beside the one before it costs no less, and going north/south from it reaches
+        a jump point. On uniform ground (an open area, a stretch of road) that is plain
+        4-connected Jump Point Search: a search jumps along a run until a turn off it
+        is needed. Wherever the costs vary, more of the tiles become jump points, down
+        to every tile on fully mixed ground, which is the ordinary weighted search.
+
+        None of that depends on the query but for the target, so build_tables() works
+        it out for every tile at once, and a jump is a few lookups instead of a scan.
+
+        : attributes:   as GridSearch (4-connected only), plus
+                        parents - tile_no: the jump point it was reached from, for the
+                        last search (the parent array isn't used)
+                        masks - tile_no: directions to go on in from each jump point
+                        found by the last search. A jump point that an equally cheap
+                        way into turns up for after it was expanded is expanded again,
+                        in the directions that way adds
+                        turns - direction: list of the directions worth turning into
+                        after stepping onto each tile in that direction
+                        next_points - direction: list of the next jump point along that
+                        direction from each tile, 0 if the run leaves the grid first.
+                        The target is left out, jump() allows for it
+                        run_costs - direction: list of running step costs along rows
+                        (EAST, WEST) or columns (NORTH, SOUTH), so the cost of a run
+                        is the difference of two of them
+                        tables_walkability - copy of the walkability the tables were
+                        built from, they are built again when it changes
+
+        : methods:      build_tables() - work out turns, next_points and run_costs
+                        jump(tile_no, dcol, drow) - follow a direction to the next jump point
+                        (jump_from() is the same with the lookups done by the caller)
+                        get_path() - every tile from target back to start, the tiles
+                        jumped over included
+    '''
+
+    def __init__(self, tiles=TILES, walkability=None, grid=None):
+        grid_search_class.GridSearch.__init__(self, tiles, walkability, grid)
+        self.masks = {}
+        self.turns = {}
+        self.next_points = {}
+        self.run_costs = {}
+        self.tables_walkability = None
+        self.parents = {}
+        self.target_col = self.target_row = 0
+
+
+    def build_tables(self):
+        ''' Work out turns, next_points and run_costs for the current walkability '''
+        tiles = self.tiles
+        costs = self.walkability[1:].reshape(tiles, tiles)      # costs[row, col]
+        turns = {bit: numpy.zeros((tiles, tiles), dtype=numpy.int64) for bit in ALL_BITS}
+        # going north the tile before is the one below, going east the one to the west, ...
+        turns[NORTH][1:, :-1] |= numpy.where(costs[:-1, 1:] > costs[1:, :-1], EAST, 0)
+        turns[NORTH][1:, 1:] |= numpy.where(costs[:-1, :-1] > costs[1:, 1:], WEST, 0)
+        turns[SOUTH][:-1, :-1] |= numpy.where(costs[1:, 1:] > costs[:-1, :-1], EAST, 0)
+        turns[SOUTH][:-1, 1:] |= numpy.where(costs[1:, :-1] > costs[:-1, 1:], WEST, 0)
+        turns[EAST][:-1, 1:] |= numpy.where(costs[1:, :-1] >= costs[:-1, 1:], NORTH, 0)
+        turns[EAST][1:, 1:] |= numpy.where(costs[:-1, :-1] >= costs[1:, 1:], SOUTH, 0)
+        turns[WEST][:-1, :-1] |= numpy.where(costs[1:, 1:] >= costs[:-1, :-1], NORTH, 0)
+        turns[WEST][1:, :-1] |= numpy.where(costs[:-1, 1:] >= costs[1:, :-1], SOUTH, 0)
+
+        rows, cols = numpy.indices((tiles, tiles))
+        next_rows = {NORTH: next_along((turns[NORTH] != 0).T, True).T,
+                     SOUTH: next_along((turns[SOUTH] != 0).T, False).T}
+        # going east/west, a turn north/south only matters if it leads to a jump point
+        leads = {NORTH: next_rows[NORTH] >= 0, SOUTH: next_rows[SOUTH] >= 0}
+        next_cols = {}
+        for bit, forward in ((EAST, True), (WEST, False)):
+            points = (((turns[bit] & NORTH) != 0) & leads[NORTH]) | (((turns[bit] & SOUTH) != 0) & leads[SOUTH])
+            next_cols[bit] = next_along(points, forward)
+        next_points = {bit: numpy.where(next_rows[bit] >= 0, next_rows[bit]*tiles + cols + 1, 0)
+                       for bit in next_rows}
+        next_points.update({bit: numpy.where(next_cols[bit] >= 0, rows*tiles + next_cols[bit] + 1, 0)
+                            for bit in next_cols})
+
+        # a run forward costs the difference of the running sums up to and including its
+        # ends, a run backward the difference of the running sums up to but excluding them
+        run_costs = {NORTH: 10*numpy.cumsum(costs, axis=0), EAST: 10*numpy.cumsum(costs, axis=1)}
+        run_costs[SOUTH] = run_costs[NORTH] - 10*costs
+        run_costs[WEST] = run_costs[EAST] - 10*costs
+
+        def as_list(table):
+            return numpy.concatenate(([0], table.ravel())).tolist()
+        self.turns = {bit: as_list(table) for bit, table in turns.items()}
+        self.next_points = {bit: as_list(table) for bit, table in next_points.items()}
+        self.run_costs = {bit: as_list(table) for bit, table in run_costs.items()}
+        self.tables_walkability = self.walkability.copy()
+
+
+    def jump(self, tile_no, dcol, drow):
+        ''' Go from tile_no in direction dcol, drow to the next jump point.
+            Returns (jump point, cost of the steps, directions to go on in from it),
+            with jump point 0 when the run leaves the grid first '''
+        straight = DIRECTION_BITS[(dcol, drow)]
+        return self.jump_from(tile_no, (tile_no-1) % self.tiles, (tile_no-1) // self.tiles,
+                              straight, dcol, drow, self.next_points[straight], self.turns[straight],
+                              self.run_costs[straight])
+
+
+    def jump_from(self, tile_no, col, row, straight, dcol, drow, next_points, turns, run_costs):
+        ''' jump(), given the column and row of tile_no and the tables of the direction '''
+        target, target_col, target_row = self.target, self.target_col, self.target_row
+        next_no = next_points[tile_no]
+        if drow:
+            if target_col == col and (target_row - row)*drow > 0 and (not next_no or (target - next_no)*drow < 0):
+                next_no = target
+        elif (target_col - col)*dcol > 0:
+            # the run crosses the target's column, where a turn towards the target leads somewhere
+            cross_no = tile_no + target_col - col
+            if cross_no == target or turns[cross_no] & (NORTH if target_row > row else SOUTH):
+                if not next_no or (cross_no - next_no)*dcol < 0:
+                    next_no = cross_no
+        if not next_no:
+            return (0, 0, 0)
+        if next_no == target:
+            next_mask = ALL_DIRECTIONS
+        else:
+            next_mask = straight | turns[next_no]
+        if dcol + drow > 0:
+            return (next_no, run_costs[next_no] - run_costs[tile_no], next_mask)
+        return (next_no, run_costs[tile_no] - run_costs[next_no], next_mask)
+
+
+    def run_search(self, start, target, max_expansions=None):
+        self.reset()
+        self.start = start
+        self.target = target
+        tiles = self.tiles
+        target_col, target_row = self.target_col, self.target_row = (target-1) % tiles, (target-1) // tiles
+        if self.tables_walkability is None or not numpy.array_equal(self.walkability, self.tables_walkability):
+            self.build_tables()
+        directions = [(bit, dcol, drow, self.next_points[bit], self.turns[bit], self.run_costs[bit])
+                      for bit, dcol, drow in DIRECTIONS]
+        hval_step = 10*self.min_walkability
+        jump_from = self.jump_from
+        self.masks = masks = {start: ALL_DIRECTIONS}
+        # the few tiles a search touches are kept in dicts, quicker to look up than the arrays
+        self.parents = parents = {start: 0}
+        gvals = {start: 0}
+        expanded = {}
+
+        open_heap = [(0, 0, start)]
+        while open_heap:
+            fval, hval, tile_no = heapq.heappop(open_heap)
+            cur_gval = fval - hval
+            if cur_gval != gvals[tile_no]:
+                continue
+            mask = masks[tile_no] & ~expanded.get(tile_no, 0)
+            if not mask:
+                continue
+            if tile_no == target:
+                return target
+            if max_expansions is not None and self.nodes_expanded >= max_expansions:
+                return 0
+            expanded[tile_no] = masks[tile_no]
+            self.nodes_expanded += 1
+            col, row = (tile_no-1) % tiles, (tile_no-1) // tiles
+            for bit, dcol, drow, next_points, turns, run_costs in directions:
+                if not mask & bit:
+                    continue
+                next_no, cost, next_mask = jump_from(tile_no, col, row, bit, dcol, drow, next_points, turns, run_costs)
+                if not next_no:
+                    continue
+                next_gval = cur_gval + cost
+                old_gval = gvals.get(next_no)
+                if old_gval is not None:
+                    if next_gval > old_gval:
+                        continue
+                    if next_gval == old_gval:
+                        if next_mask & ~masks[next_no]:
+                            masks[next_no] |= next_mask
+                            if next_no in expanded:
+                                next_hval = self.get_hval(next_no)
+                                heapq.heappush(open_heap, (next_gval + next_hval, next_hval, next_no))
+                        continue
+                gvals[next_no] = next_gval
+                parents[next_no] = tile_no
+                masks[next_no] = next_mask
+                next_hval = hval_step*(abs(target_col - (next_no-1) % tiles) + abs(target_row - (next_no-1) // tiles))
+                heapq.heappush(open_heap, (next_gval + next_hval, next_hval, next_no))
+        return 0
+
+
+    def get_path(self):
+        tiles = self.tiles
+        path_list = []
+        tile_no = self.target
+        while tile_no != self.start:
+            prev_no = self.parents[tile_no]
+            if (tile_no-1) // tiles == (prev_no-1) // tiles:
+                step = 1 if tile_no > prev_no else -1
+            else:
+                step = tiles if tile_no > prev_no else -tiles
+            while tile_no != prev_no:
+                path_list.append(tile_no)
+                tile_no -= step
+        path_list.append(self.start)
+        return path_list
+
+
+class TestJumpPointSearch(unittest.TestCase):
+    def check_against_grid_search(self, walkability, tiles, queries):
+        grid_search = grid_search_class.GridSearch(tiles, walkability)
+        jump_search = JumpPointSearch(tiles, walkability)
+        for start, target in queries:
+            self.assertEqual(bool(jump_search.search(start, target)), bool(grid_search.search(start, target)))
+            path_list = jump_search.get_path()
+            self.assertEqual((path_list[0], path_list[-1]), (target, start))
+            for tile_no, next_no in zip(path_list, path_list[1:]):
+                self.assertTrue(next_no in jump_search.grid.get_surrounding_tiles(tile_no))
+            self.assertEqual(jump_search.get_cost(path_list), grid_search.get_cost(grid_search.get_path()),
+                             "Jump point path from {0} to {1} is not the cheapest".format(start, target))
+
+    def test_matches_astar(self):
+        import map_class
+        import a_star_class
+        test_map = map_class.LevelMap(headless=True)
+        test_map.map_creator(seed=4)
+        tile_dict = test_map.return_dict_of_tiles()
+        jump_search = JumpPointSearch()
+        jump_search.load_tiles(tile_dict)
+        heap_astar = a_star_class.A_Star(use_heap=True)
+        for start, target in ((1, TILES*TILES), (TILES, TILES*(TILES-1) + 1), (TILES*TILES//2, 1)):
+            heap_astar.init_AStar(tile_dict, start, target)
+            heap_astar.run_AStar(start)
+            astar_gval = tile_dict[target].gval
+            heap_astar.reset()
+            jump_search.search(start, target)
+            self.assertEqual(jump_search.get_cost(jump_search.get_path()), astar_gval)
+
+    def test_mixed_costs(self):
+        rng = numpy.random.default_rng(7)
+        tiles = 12
+        for density in (0.1, 0.5, 0.9):
+            for i in range(10):
+                walkability = rng.choice([1, 20, 100], tiles*tiles, p=[density, (1-density)/2, (1-density)/2])
+                queries = [tuple(int(n) for n in rng.integers(1, tiles*tiles+1, 2)) for j in range(5)]
+                self.check_against_grid_search(walkability, tiles, queries)
+
+    def test_walkability_change(self):
+        tiles = 12
+        rng = numpy.random.default_rng(5)
+        walkability = rng.choice([1, 20, 100], tiles*tiles)
+        grid_search = grid_search_class.GridSearch(tiles, walkability)
+        jump_search = JumpPointSearch(tiles, walkability)
+        jump_search.search(1, tiles*tiles)
+        for tile_no in rng.integers(1, tiles*tiles+1, 20):
+            grid_search.walkability[tile_no] = jump_search.walkability[tile_no] = 100
+        jump_search.search(1, tiles*tiles)
+        grid_search.search(1, tiles*tiles)
+        self.assertEqual(jump_search.get_cost(jump_search.get_path()), grid_search.get_cost(grid_search.get_path()),
+                         "Changed tiles should be seen by the next search")
+
+    def count_expansions(self, walkability, tiles, queries):
+        grid_search = grid_search_class.GridSearch(tiles, walkability)
+        jump_search = JumpPointSearch(tiles, walkability)
+        grid_expanded = jump_expanded = 0
+        for start, target in queries:
+            grid_search.search(start, target)
+            jump_search.search(start, target)
+            grid_expanded += grid_search.nodes_expanded
+            jump_expanded += jump_search.nodes_expanded
+        return grid_expanded, jump_expanded
+
+    def test_fewer_expansions(self):
+        tiles = 40
+        queries = [(1, tiles*tiles), (tiles, tiles*(tiles-1) + 1), (tiles*tiles//2 + 3, 5)]
+        # open ground: a couple of jump points instead of every tile along the way
+        grid_expanded, jump_expanded = self.count_expansions(numpy.ones(tiles*tiles), tiles, queries)
+        self.assertTrue(jump_expanded*10 < grid_expanded)
+
+        # generated roads between empty lots
+        generator = map_generator_class.MapGenerator(tiles, seed=1)
+        generator.draw_road()
+        walkability = numpy.where(generator.types[1:] == map_generator_class.ROAD,
+                                  TILE_WALKABILITY['road'], TILE_WALKABILITY['empty'])
+        rng = numpy.random.default_rng(1)
+        queries = [tuple(int(n) for n in rng.integers(1, tiles*tiles+1, 2)) for i in range(10)]
+        self.check_against_grid_search(walkability, tiles, queries)
+        grid_expanded, jump_expanded = self.count_expansions(walkability, tiles, queries)
+        self.assertTrue(jump_expanded*3 < grid_expanded*2,
+                        "{0} jump points expanded against {1} tiles".format(jump_expanded, grid_expanded))
+
+if __name__ == '__main__':
+    unittest.main()
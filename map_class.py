@@ -3,13 +3,28 @@
 #
 
 import pygame
+import os
 import sys
 from pygame.locals import *
 from game_constants import *
 from tile_class import *
-import random
-import a_star_class
+import asset_class
+import camera_class
+import chunk_class
+import grid_class
+import grid_search_class
+import sliced_search_class
+import tile_store_class
+import path_cache_class
+import flow_field_class
+import map_generator_class
+import map_file_class
+import numpy
+import profiler_class
+import game_loop_class
+import unit_class
 import unittest
+import tempfile
 
 
 class LevelMap(pygame.sprite.Group):
@@ -23,33 +38,94 @@ class LevelMap(pygame.sprite.Group):
                             .add(*sprites) - add any num. of sprites to this Group
                             .remove(*sprites) - remove any num. of sprites from this group
                             .draw(surface) - draws the contained sprites to surface
-        : attributes:
+        : attributes:   tiles - number of tiles along a side of the map, TILES by default
+                        grid - the shared Grid for that size, with the neighbour tables
+                        and tile number conversions the searches and camera use
+                        headless - when True no window is opened and no images or
+                        fonts are loaded: the map can be generated, saved and searched
+                        but not drawn (display is None and draw_tiles does nothing)
+                        vsync - whether the window flips in step with the display. Asked
+                        for with vsync=True, False if the display can't do it or flips
+                        don't actually wait for it
+                        compact - when True tile_list is a TileStore, a couple of bytes
+                        per tile in numpy arrays handing out TileViews on demand, instead
+                        of a list of Tile objects. For maps of millions of tiles. The
+                        tiles then carry no A_Star fields, search them with find_path()
+                        seed - the seed the map was generated from, see map_creator()
+                        images - ImageCache the tile images are drawn from. The building
+                        images are loaded when the map is created, unless
+                        preload_images is False, in which case they load on first draw
+                        texts - TextCache the tile labels are drawn from
+                        camera - Camera giving the part of the map in the window. Tiles
+                        keep the world coordinates they were created with, dragging
+                        the map moves the camera
+                        chunks - ChunkedMapLayer the map is drawn from once enable_chunks()
+                        is called, None while tiles are drawn one by one
+                        version - bumped every time tiles change type, so anything
+                        worked out from the tiles (like cached paths) can tell it is stale
+                        path_cache - PathCache for find_path()
+                        units - Units, the tanks, missiles and the like, moved together
+                        every tick by units.update()
+                        flow_field - FlowField from get_flow_field()
         : methods:
     '''
 
-    def __init__(self):
+    def __init__(self, preload_images=True, tiles=TILES, headless=False, compact=False, vsync=False):
         pygame.sprite.Group.__init__(self)
+        self.tiles = tiles
+        self.grid = grid_class.get_grid(tiles)
+        self.seed = None
         self.offsetx = 0    #offset along the x axis when map is dragged with mouse
         self.offsety = 0    #offset along the y axis
         self.tile_list = []
-        self.display = pygame.display.set_mode((WINDOWSIZE, WINDOWSIZE))
+        self.compact = compact
+        self.headless = headless
+        self.vsync = False
+        if headless:
+            self.display = None
+        elif vsync:
+            # vsync needs a SCALED (or OPENGL) window, and not every driver has it
+            try:
+                self.display = pygame.display.set_mode((WINDOWSIZE, WINDOWSIZE), pygame.SCALED, vsync=1)
+                self.vsync = game_loop_class.flip_waits()
+            except pygame.error:
+                self.display = pygame.display.set_mode((WINDOWSIZE, WINDOWSIZE))
+        else:
+            self.display = pygame.display.set_mode((WINDOWSIZE, WINDOWSIZE))
         self.road = []
-
-
-    def map_creator(self):
+        self.images = asset_class.ImageCache()
+        if preload_images and not headless:
+            self.images.preload('artwork/' + img for img in IMAGE_LIST)
+        self.texts = asset_class.TextCache()
+        self.camera = camera_class.Camera(grid=self.grid)
+        self.chunks = None
+        self.version = 0
+        self.path_cache = path_cache_class.PathCache()
+        self.grid_search = None
+        self.flow_field = None
+        self.units = unit_class.Units(grid=self.grid)
+
+
+    def map_creator(self, seed=None):
         """ This function will generate a random map, with a road that the sprites can
-            move on and buildings """
+            move on and buildings. The same seed always gives the same map, with
+            no seed a random one is picked and kept in self.seed """
+        generator = map_generator_class.MapGenerator(self.tiles, seed).generate()
         self.initialize_tiles()         # first create an empty tile grid
-        self.draw_road_thru_map()       # generate a random road (self.road)
-        self.draw_buildings()           # fill the remaining tiles with buildings
+        self.road = generator.road
+        self.seed = generator.seed
+        self.set_tile_types(generator.types, generator.images)
 
 
     def initialize_tiles(self):
         ''' Initialize the bare bones tiles of the map '''
+        if self.compact:
+            self.tile_list = tile_store_class.TileStore(grid=self.grid)
+            return
         count = 1
-        for y in range(TILESIZE, (TILES+1)*TILESIZE, TILESIZE):
+        for y in range(TILESIZE, (self.tiles+1)*TILESIZE, TILESIZE):
             tiley = WINDOWSIZE - y
-            for x in range(0, TILES*TILESIZE, TILESIZE):
+            for x in range(0, self.tiles*TILESIZE, TILESIZE):
                 tilex = x
                 self.tile_list.append(Tile("empty", count,
                                            tilex, tiley,
@@ -57,126 +133,230 @@ class LevelMap(pygame.sprite.Group):
                 count +=1
 
 
+    def set_tile_types(self, types, images):
+        """ Set every tile's type from an array of map_generator_class type codes,
+            and the building image of city tiles from an array of IMAGE_LIST indexes """
+        if self.compact:
+            self.tile_list.set_types(types, images)
+            self.tiles_changed()
+            return
+        types = types.tolist()
+        images = images.tolist()
+        for tile in self.tile_list:
+            tile.type = map_generator_class.TILE_TYPES[types[tile.number]]
+            tile.set_colors()
+            tile.set_walkability()
+            if tile.type == 'city':
+                tile.img_path = 'artwork/' + IMAGE_LIST[images[tile.number]]
+            else:
+                tile.img_path = ""
+        self.tiles_changed()
+
+
+    def tiles_changed(self):
+        """ Call after changing many tiles at once: bumps version and drops everything
+            worked out from the old tiles (search, flow field, pre-drawn chunks) """
+        self.version += 1
+        self.grid_search = None
+        self.flow_field = None
+        if self.chunks is not None:
+            self.chunks.invalidate_all()
+
+
+    def save_map(self, path):
+        """ Save the tile types, building images and seed of the map to a map file """
+        if self.compact:
+            types, images = self.tile_list.types, self.tile_list.images
+        else:
+            types = numpy.zeros(self.tiles*self.tiles + 1, dtype=numpy.uint8)
+            images = numpy.zeros(self.tiles*self.tiles + 1, dtype=numpy.uint8)
+            for tile in self.tile_list:
+                types[tile.number] = map_generator_class.TILE_TYPES.index(tile.type)
+                if tile.type == 'city':
+                    images[tile.number] = IMAGE_LIST.index(os.path.basename(tile.img_path))
+        map_file_class.save_map(path, self.tiles, self.tiles, self.seed, types, images)
+
+
+    def load_map(self, path):
+        """ Replace the map with the one saved in a map file """
+        map_file = map_file_class.MapFile(path)
+        if map_file.width != map_file.height:
+            raise ValueError("{0} holds a {1}x{2} map, maps must be square".format(path, map_file.width, map_file.height))
+        self.tiles = map_file.width
+        self.grid = grid_class.get_grid(self.tiles)
+        self.seed = map_file.seed
+        self.camera = camera_class.Camera(grid=self.grid)
+        self.units = unit_class.Units(grid=self.grid)
+        if self.chunks is not None:
+            self.enable_chunks(self.chunks.chunk_tiles)
+        self.tile_list = []
+        self.initialize_tiles()
+        self.set_tile_types(map_file.types, map_file.images)
+        self.road = numpy.flatnonzero(map_file.types == map_generator_class.ROAD).tolist()
+        map_file.close()
+
+
     def draw_buildings(self):
         """ Set tiles which are not part of the road to buildings """
+        road = set(self.road)
         for tile in self.tile_list:
-            if tile.number not in self.road:
+            if tile.number not in road:
                 tile.type = 'city'
                 tile.set_images()
                 tile.set_walkability()
+        self.tiles_changed()
 
 
-    def draw_road_thru_map(self):
-        """ This method will create roads.
-            Roads are created by using the A-Star algorithm. We get a "path" from
-            a start tile to the "next" tile (generated randomly). The tiles along
-            this path are converted to 'road' type.
-        """
-        # road_dist_x is a list of distances to the next tile along x-axis
-        road_dist_x = [x for x in range(0, TILES//2)]
-        # road_dist_y is a list of distances to the next tile along y-axis
-        road_dist_y = [x for x in range(0, TILES*TILES//2, TILES)]
-
-        # the distances are used to get the next tile = start + dist_x + dist_y
-        #                                  ex. next_tile = 1 + 3 + 30 = 34
-        #                                  so tile 34 will be the target for AStar
-        # we only look at half the possible distances (TILES//2 or TILES*TILES//2)
-        # because we don't want to get the tiles further than the max, TILES*TILES
-
-        random.shuffle(road_dist_x)     # so we get a different tile each time
-        random.shuffle(road_dist_y)     # so we get a different tile each time
-        start_tile = 1                  # start on tile no. 1 (FUTURE UPDATE - change the start location)
-        road_plan = a_star_class.A_Star()
-
-        # We will call the draw_road_segment() function to get pieces of the road
-        # until we go from tile 1 (very beginning tile) to tile max (the tile to reach to win)
-        while len(road_dist_x) > 0:
-            next_tile = start_tile + road_dist_x.pop() + road_dist_y.pop()
-            # If the starting tile is in the top row, the next tile should be last tile
-            if start_tile > TILES*(TILES-1):
-                next_tile = TILES*TILES
-            # If the next tile is to the left of the start tile, go up a row (so road doesn't wrap on itself)
-            if next_tile%TILES < start_tile%TILES:
-                next_tile+=TILES
-            # if the next tile is higher than the max possible tile, reset it to the max tile
-            if next_tile > TILES*TILES:
-                next_tile = TILES*TILES
-
-            self.draw_road_segment(start_tile, next_tile, road_plan)
-            start_tile = next_tile
-
-        # Remove the repeated tiles
-        for point in self.road:
-            indx = self.road.index(point)
-            if point in self.road[indx+1:]:
-                self.road.remove(point)
-        # We want road segments to connect to the main road from the 2 other corners too
-        # First we connect the bottom right corner to a lower part of the road (look at the first half of the list)
-        self.draw_road_segment(TILES, random.choice(self.road[:len(self.road)//2]), road_plan)
-        # Then we connect the top left corner to a higher part of the road (second half of the list)
-        self.draw_road_segment(TILES*(TILES-1) + 1, random.choice(self.road[len(self.road)//2:]), road_plan)
-        # Change the tiles in the map to road
+    def draw_road_thru_map(self, seed=None):
+        """ This method will create roads, see MapGenerator.draw_road(), and change
+            the tiles along them to 'road' type """
+        generator = map_generator_class.MapGenerator(self.tiles, seed)
+        generator.draw_road()
+        self.road = generator.road
+        self.seed = generator.seed
+        road = set(self.road)
         for tile in self.tile_list:
-            if tile.number in self.road:
+            if tile.number in road:
                 tile.type = 'road'
                 tile.set_colors()
                 tile.set_walkability()
-
-
-    def draw_road_segment (self, start_tile, next_tile, road_plan):
-        """ This method will give us the path from the start tile to the next tile -
-            giving us the segment of the road, which we will append to self.road
-        """
-        road_plan.init_AStar(self.return_dict_of_tiles(), start_tile, next_tile)
-        road_plan.run_AStar(start_tile)
-        segment = road_plan.get_path()
-        segment.reverse()
-        self.road += segment
-        road_plan.reset()
-        start_tile = next_tile
+        self.tiles_changed()
 
 
     def draw_tiles(self):
         ''' Draw the tiles that are within the window to the screen
             If we have 1000 tiles, and can see only 100 in the display screen,
             we don't want to draw the 900 others. We only want to see the 100 visible
-            tiles. This function figures out which of the tiles are currently visible
-            and only draws those '''
-        for tile in self.tile_list:
-            tile.x += self.offsetx
-            tile.y += self.offsety
-            if tile.x >= -TILESIZE and tile.x < WINDOWSIZE+TILESIZE and tile.y >= -TILESIZE and tile.y < WINDOWSIZE+TILESIZE:
-                if tile.type == 'road' or tile.type == 'empty':
-                    pygame.draw.rect(self.display, tile.color, tile)
-                    self.text_to_screen(tile.number, tile.x+TILESIZE/2, tile.y+TILESIZE/2)
-                elif tile.type == 'city':
-                    img = pygame.image.load(tile.img_path)
-                    self.display.blit(img, (tile.x, tile.y))
+            tiles. The camera works out which of the tiles are currently visible
+            and only those are looked at '''
+        if self.display is None:
+            return
+        if self.chunks is not None:
+            self.chunks.draw(self.display, self.camera)
+            return
+        tiles_drawn = 0
+        for tile_no in self.camera.visible_tiles():
+            tile = self.tile_list[tile_no-1]
+            x, y = self.camera.to_screen(tile.x, tile.y)
+            self.draw_tile(self.display, tile, x, y)
+            tiles_drawn += 1
+        # every tile is one blit, its label or its image
+        profiler_class.PROFILER.count('tiles_drawn', tiles_drawn)
+        profiler_class.PROFILER.count('blits', tiles_drawn)
+
+
+    def draw_tile(self, surface, tile, x, y):
+        ''' Draw a single tile onto surface with its upper left corner at x,y '''
+        if tile.type == 'road' or tile.type == 'empty':
+            pygame.draw.rect(surface, tile.color, (x, y, tile.width, tile.height))
+            surface.blit(self.texts.get(tile.number), (x+TILESIZE/2, y+TILESIZE/2))
+        elif tile.type == 'city':
+            img = self.images.get(tile.img_path)
+            surface.blit(img, (x, y))
+
+
+    def enable_chunks(self, chunk_tiles=None):
+        ''' Draw the map from pre-drawn chunks of chunk_tiles x chunk_tiles tiles
+            (chunk_class.CHUNK_TILES when not given).
+            Use set_tile_type() to change tiles afterwards, so their chunk is redrawn '''
+        if chunk_tiles is None:
+            chunk_tiles = chunk_class.CHUNK_TILES
+        self.chunks = chunk_class.ChunkedMapLayer(self, chunk_tiles)
+
+
+    def set_tile_type(self, tile_no, tile_type):
+        """ Change the type of a tile after the map is made, e.g. when the dragon
+            burns a building down """
+        tile = self.tile_list[tile_no-1]
+        tile.type = tile_type
+        tile.set_colors()
+        tile.set_images()
+        tile.set_walkability()
+        self.version += 1
+        if self.grid_search is not None:
+            self.grid_search.walkability[tile_no] = tile.walkability
+        if self.chunks is not None:
+            self.chunks.invalidate_tile(tile_no)
+
+
+    def find_path(self, start, target):
+        """ The cheapest path from start to target as a list of tile numbers, start
+            first, or [] if there is none. Asking again for the same path on an
+            unchanged map is answered from self.path_cache """
+        return self.path_cache.get_path(start, target, self.version, self.search_path)
+
+
+    def search_path(self, start, target):
+        """ Uncached find_path() """
+        grid_search = self.get_grid_search()
+        if not grid_search.search(start, target):
+            return []
+        path = grid_search.get_path()
+        path.reverse()
+        return path
+
+
+    def start_path_search(self, start, target, max_nodes=None, max_microseconds=None):
+        """ SlicedSearch for a path from start to target, to be run a step() per
+            frame with the given budget instead of all at once """
+        return sliced_search_class.SlicedSearch(self.get_grid_search(), start, target,
+                                                max_nodes, max_microseconds)
+
+
+    def get_grid_search(self):
+        """ GridSearch holding the walkability of the current tiles """
+        if self.grid_search is None:
+            if self.compact:
+                self.grid_search = grid_search_class.GridSearch(grid=self.grid,
+                                                                walkability=self.tile_list.get_walkability()[1:])
+            else:
+                self.grid_search = grid_search_class.GridSearch(grid=self.grid)
+                self.grid_search.load_tiles(self.return_dict_of_tiles())
+        return self.grid_search
+
+
+    def get_flow_field(self, target):
+        """ FlowField leading every tile to target. It is only recomputed when the
+            target or the map changed since the last call """
+        grid_search = self.get_grid_search()
+        if self.flow_field is None or self.flow_field.grid is not grid_search:
+            self.flow_field = flow_field_class.FlowField(grid_search)
+        self.flow_field.update(target, self.version)
+        return self.flow_field
 
 
     def from_xy_to_tile_no(self, point):
         """ Return the tile number of the tile that contains the mouse click x,y in """
-        point_on_tile_no = 0
-        for tile in self.tile_list:
-            if tile.collidepoint(point):
-                point_on_tile_no = tile.number
+        return self.camera.tile_at(point)
 
-        return point_on_tile_no
+
+    def from_xy_array_to_tile_nos(self, points):
+        """ from_xy_to_tile_no for an (n, 2) array of points, e.g. projectiles or
+            units, returned as an array of n tile numbers """
+        return self.camera.tiles_at(points)
 
 
     def set_drag_offsets(self, offsets):
-        """ Scrolled offsets are stored and used to calculate how to render the map """
+        """ Scrolled offsets are stored and the camera is moved the other way, so
+            the map follows the mouse """
         self.offsetx = offsets[0]
         self.offsety = offsets[1]
+        self.camera.move(-self.offsetx, -self.offsety)
+
+
+    def get_view_state(self):
+        """ Everything a drawn frame depends on: the tiles and units (by version),
+            the camera and where each sprite is. While it is unchanged the last frame
+            still holds """
+        return (self.version, self.units.version, self.camera.x, self.camera.y,
+                tuple(tuple(sprite.rect.topleft) for sprite in self.sprites()))
 
 
     def text_to_screen(self, text, x, y, size = 10,
                     color = (255, 255, 255), font_type = 'monospace'):
-
-        text = str(text)
-        font = pygame.font.SysFont('monospace', size)
-        text = font.render(text, True, color)
-        self.display.blit(text, (x,y))
+        """ Blit text at x, y. Rendered labels are cached, so each tile number is
+            only rendered the first time it is drawn """
+        self.display.blit(self.texts.get(text, size, color, font_type), (x,y))
 
 
     def return_dict_of_tiles(self):
@@ -198,46 +378,193 @@ class TestLevelMap(unittest.TestCase):
         for tile_no in range(1, TILES*TILES):
             self.assertEqual(test_dict[tile_no].number, self.test_map.tile_list[tile_no-1].number, "Tiles dictionary to tiles list mismatch: at tile {0}".format(tile_no))
 
+    def test_seeded_map(self):
+        first_map = LevelMap(tiles=20)
+        first_map.map_creator(seed=3)
+        second_map = LevelMap(tiles=20)
+        second_map.map_creator(seed=first_map.seed)
+        self.assertEqual([(tile.type, tile.img_path) for tile in first_map.tile_list],
+                         [(tile.type, tile.img_path) for tile in second_map.tile_list],
+                         "The same seed should give the same map")
+        self.assertEqual(sorted(first_map.road), [tile.number for tile in first_map.tile_list if tile.type == 'road'])
+
+    def test_save_and_load(self):
+        handle, path = tempfile.mkstemp(suffix='.map')
+        os.close(handle)
+        saved_map = LevelMap(tiles=20)
+        saved_map.map_creator(seed=5)
+        saved_map.save_map(path)
+        self.test_map.load_map(path)
+        os.remove(path)
+        self.assertEqual((self.test_map.tiles, self.test_map.seed), (20, 5))
+        self.assertEqual([(tile.type, tile.img_path) for tile in self.test_map.tile_list],
+                         [(tile.type, tile.img_path) for tile in saved_map.tile_list])
+
+    def test_headless(self):
+        pygame.display.quit()
+        pygame.font.quit()
+        headless_map = LevelMap(headless=True)
+        headless_map.map_creator(seed=1)
+        headless_map.draw_tiles()
+        self.assertEqual(headless_map.find_path(1, 1), [1])
+        self.assertGreaterEqual(len(headless_map.find_path(1, TILES*TILES)), 2*TILES-1)
+        self.assertFalse(pygame.display.get_init(), "A headless map should not start the display")
+        self.assertFalse(pygame.font.get_init(), "A headless map should not start the fonts")
+        self.assertEqual(len(headless_map.images.images), 0)
+
+    def test_find_path(self):
+        self.test_map.draw_buildings()
+        path = self.test_map.find_path(1, TILES*TILES)
+        self.assertEqual((path[0], path[-1]), (1, TILES*TILES))
+        self.assertEqual(self.test_map.find_path(1, TILES*TILES), path)
+        self.assertEqual((self.test_map.path_cache.hits, self.test_map.path_cache.misses), (1, 1))
+
+        city_tile = next(tile for tile in self.test_map.tile_list if tile.type == 'city')
+        self.test_map.set_tile_type(city_tile.number, 'empty')
+        self.test_map.find_path(1, TILES*TILES)
+        self.assertEqual(self.test_map.path_cache.misses, 2, "Changing a tile should invalidate cached paths")
+
+    def test_compact(self):
+        compact_map = LevelMap(tiles=20, compact=True)
+        compact_map.map_creator(seed=3)
+        tile_map = LevelMap(tiles=20)
+        tile_map.map_creator(seed=3)
+        self.assertEqual([(tile.type, tile.img_path, tile.x, tile.y) for tile in compact_map.tile_list],
+                         [(tile.type, tile.img_path, tile.x, tile.y) for tile in tile_map.tile_list])
+        self.assertEqual(compact_map.find_path(1, 400), tile_map.find_path(1, 400))
+
+        compact_map.set_tile_type(21, 'city')
+        self.assertEqual((compact_map.tile_list[20].type, compact_map.get_grid_search().walkability[21]), ('city', 100))
+        for level_map in (compact_map, tile_map):
+            level_map.display.fill(BLACK)
+            level_map.set_tile_type(21, 'road')
+            level_map.draw_tiles()
+            level_map.frame = pygame.image.tostring(level_map.display, 'RGB')
+        self.assertEqual(compact_map.frame, tile_map.frame, "A compact map should be drawn the same")
+
+    def test_drag_keeps_tiles_in_place(self):
+        tile_xy = [(tile.x, tile.y) for tile in self.test_map.tile_list]
+        clicked = self.test_map.from_xy_to_tile_no((10, WINDOWSIZE-10))
+        self.test_map.set_drag_offsets((TILESIZE, -TILESIZE))
+        self.test_map.draw_tiles()
+        self.assertEqual([(tile.x, tile.y) for tile in self.test_map.tile_list], tile_xy,
+                            "Scrolling the map should not move the tiles")
+        self.assertEqual(self.test_map.from_xy_to_tile_no((10+TILESIZE, WINDOWSIZE-10-TILESIZE)), clicked,
+                            "Clicking on a dragged tile should still find that tile")
+
+    def test_vsync(self):
+        vsync_map = LevelMap(vsync=True)
+        if pygame.display.get_driver() == 'dummy':
+            self.assertFalse(vsync_map.vsync, "The dummy driver's flips don't wait for a display")
+
+    def test_view_state(self):
+        view_state = self.test_map.get_view_state()
+        self.assertEqual(self.test_map.get_view_state(), view_state)
+        self.test_map.set_drag_offsets((0, 0))
+        self.assertEqual(self.test_map.get_view_state(), view_state, "A still map needs no redraw")
+        self.test_map.set_drag_offsets((5, 0))
+        self.assertNotEqual(self.test_map.get_view_state(), view_state, "Dragging should redraw")
+        view_state = self.test_map.get_view_state()
+        self.test_map.set_tile_type(1, 'road')
+        self.assertNotEqual(self.test_map.get_view_state(), view_state, "A changed tile should redraw")
+
 
 
 def main():
-    my_map = LevelMap()
+    # frames are paced by the display where it can, by the loop's clock otherwise
+    my_map = LevelMap(vsync=True)
     my_map.map_creator()
     #my_map.initialize_tiles()
     #my_map.draw_road_thru_map()
     pygame.init()
-    drag_flag = 0
-    button3 = 0
-    while True:
-        my_map.display.fill(BLACK)
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            # mousebutton down event generated, and the right-click is pressed
-            # then we can begin the map dragging
-            if event.type == pygame.MOUSEBUTTONDOWN and pygame.mouse.get_pressed()[2]:
-                drag_flag = 1
-                # since we want the relative mouse position from the point of
-                # right click, and not between some previous point and point of
-                # right click, we flush the first result of get_rel():
-                pygame.mouse.get_rel()
-            elif event.type == pygame.MOUSEBUTTONUP and not pygame.mouse.get_pressed()[2]:
-                drag_flag = 0
-                # we want to set the drag offsets to zero when the right click
-                # is depressed
-                my_map.set_drag_offsets((0,0))
-
-            if event.type == pygame.MOUSEBUTTONDOWN and pygame.mouse.get_pressed()[0]:
-                print("Clicked on tile: {0}".format(my_map.from_xy_to_tile_no(pygame.mouse.get_pos())))
-
-
-        if drag_flag:
-            my_map.set_drag_offsets(pygame.mouse.get_rel())
-
-        my_map.draw_tiles()
-
-        pygame.display.flip()
+    # 'p' turns the profiler and its overlay on and off. While it is on the
+    # timings are also written to profile.csv every few seconds
+    profiler = profiler_class.PROFILER
+    profiler.dump_path = 'profile.csv'
+    # input: right click drags the map, left clicks ask for a path from the
+    # previous clicked tile, searched for at most 2 ms a tick so the window never
+    # freezes on a long one. 't' drops a tank under the mouse heading somewhere at
+    # random and 'm' fires a missile from there up the screen, a missile hitting
+    # a tank destroys both
+    state = {'drag_flag': 0, 'clicked_tile': 0, 'path_search': None}
+
+    def update(tick_seconds):
+        with profiler.scope('events'):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    loop.stop()
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                    profiler.enabled = not profiler.enabled
+                    loop.mark_dirty()
+                if event.type == pygame.WINDOWEXPOSED:
+                    loop.mark_dirty()
+                if event.type == pygame.KEYDOWN and event.key in (pygame.K_t, pygame.K_m):
+                    position = my_map.camera.to_world(*pygame.mouse.get_pos())
+                    if event.key == pygame.K_t:
+                        my_map.units.add(unit_class.TANK, position, numpy.random.uniform(-1, 1, 2))
+                    else:
+                        my_map.units.add(unit_class.MISSILE, position, (0, -1))
+                # mousebutton down event generated, and the right-click is pressed
+                # then we can begin the map dragging
+                if event.type == pygame.MOUSEBUTTONDOWN and pygame.mouse.get_pressed()[2]:
+                    state['drag_flag'] = 1
+                    # since we want the relative mouse position from the point of
+                    # right click, and not between some previous point and point of
+                    # right click, we flush the first result of get_rel():
+                    pygame.mouse.get_rel()
+                elif event.type == pygame.MOUSEBUTTONUP and not pygame.mouse.get_pressed()[2]:
+                    state['drag_flag'] = 0
+                    # we want to set the drag offsets to zero when the right click
+                    # is depressed
+                    my_map.set_drag_offsets((0,0))
+
+                if event.type == pygame.MOUSEBUTTONDOWN and pygame.mouse.get_pressed()[0]:
+                    tile_no = my_map.from_xy_to_tile_no(pygame.mouse.get_pos())
+                    print("Clicked on tile: {0}".format(tile_no))
+                    if state['clicked_tile'] and tile_no:
+                        state['path_search'] = my_map.start_path_search(state['clicked_tile'], tile_no,
+                                                                        max_microseconds=2000)
+                    state['clicked_tile'] = tile_no
+
+            if state['drag_flag']:
+                my_map.set_drag_offsets(pygame.mouse.get_rel())
+
+        with profiler.scope('units'):
+            my_map.units.update(tick_seconds)
+            tanks, missiles = my_map.units.collisions(unit_class.TANK, unit_class.MISSILE)
+            if tanks.size:
+                my_map.units.remove(numpy.concatenate([tanks, missiles]))
+
+        path_search = state['path_search']
+        if path_search is not None:
+            with profiler.scope('path_search'):
+                if path_search.step() != sliced_search_class.SEARCHING:
+                    print("Path found in {0} ticks: {1}".format(path_search.steps, path_search.get_path()))
+                    state['path_search'] = None
+
+    def render(alpha):
+        with profiler.scope('draw_tiles'):
+            my_map.display.fill(BLACK)
+            my_map.draw_tiles()
+        with profiler.scope('draw_units'):
+            my_map.units.draw(my_map.display, my_map.camera, my_map.images, alpha)
+        if profiler.enabled:
+            profiler.draw_overlay(my_map.display)
+
+        with profiler.scope('flip'):
+            pygame.display.flip()
+        profiler.end_frame()
+
+    def get_state():
+        # the overlay changes every frame, so while it is up every frame is drawn
+        return my_map.get_view_state() + (profiler.enabled and profiler.frames,)
+
+    # the map is only redrawn when it, the camera or a sprite moved: a still
+    # window costs a few wakeups a second instead of a whole core
+    loop = game_loop_class.GameLoop(update, render, get_state, vsync=my_map.vsync)
+    loop.run()
+    pygame.quit()
+    sys.exit()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,113 @@
+#
+# map_file_class - saves a map as a small binary file and opens it again with
+#                  memory mapping, so only the parts that are read get loaded
+#
+
+import os
+import struct
+import tempfile
+import unittest
+import numpy
+from game_constants import *
+import map_generator_class
+
+# file layout: header, then tile type codes, then building image indexes. Both
+# arrays have a byte for every tile number, including an unused one for 0, so
+# they are indexed by tile number like the MapGenerator arrays
+MAGIC = b'DRGM'
+FORMAT_VERSION = 2
+HEADER = struct.Struct('<4sHHIIQ')      # magic, format version, flags, width, height, seed
+SEEDED = 1                              # flag: the seed field holds the map's seed
+
+
+class MapFile():
+    ''' MapFile class : a map file opened for reading
+
+        : attributes:   width, height - of the map, in tiles
+                        seed - the seed the map was generated from, None if it wasn't
+                        types - tile type codes (see map_generator_class), types[tile_no]
+                        images - IMAGE_LIST index of each city tile's building
+                        Both arrays are read-only numpy memmaps into the file
+
+        : methods:      get_tile_type(tile_no) - type name of a tile
+                        close() - drop the arrays, which releases the file
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as map_file:
+            header = map_file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError("{0} is not a map file".format(path))
+        magic, version, flags, self.width, self.height, seed = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError("{0} is not a map file".format(path))
+        if version != FORMAT_VERSION:
+            raise ValueError("{0} has map format version {1}, expected {2}".format(path, version, FORMAT_VERSION))
+        self.seed = seed if flags & SEEDED else None
+
+        size = self.width*self.height + 1
+        self.data = numpy.memmap(path, dtype=numpy.uint8, mode='r', offset=HEADER.size, shape=(2*size,))
+        self.types = self.data[:size]
+        self.images = self.data[size:]
+
+
+    def get_tile_type(self, tile_no):
+        return map_generator_class.TILE_TYPES[self.types[tile_no]]
+
+
+    def close(self):
+        self.data = None
+        self.types = None
+        self.images = None
+
+
+def save_map(path, width, height, seed, types, images):
+    ''' Write a map file. types and images are arrays indexed by tile number, with
+        width*height + 1 entries. seed is None for a map that wasn't generated from one '''
+    size = width*height + 1
+    types = numpy.asarray(types, dtype=numpy.uint8)
+    images = numpy.asarray(images, dtype=numpy.uint8)
+    if len(types) != size or len(images) != size:
+        raise ValueError("Expected {0} tile types and images, got {1} and {2}".format(size, len(types), len(images)))
+    with open(path, 'wb') as map_file:
+        flags = 0 if seed is None else SEEDED
+        map_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, width, height, seed or 0))
+        map_file.write(types.tobytes())
+        map_file.write(images.tobytes())
+
+
+class TestMapFile(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.map')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        generator = map_generator_class.MapGenerator(tiles=30, seed=11).generate()
+        save_map(self.path, 30, 30, generator.seed, generator.types, generator.images)
+        self.assertEqual(os.path.getsize(self.path), HEADER.size + 2*(30*30 + 1))
+        map_file = MapFile(self.path)
+        self.assertEqual((map_file.width, map_file.height, map_file.seed), (30, 30, 11))
+        self.assertTrue((map_file.types == generator.types).all())
+        self.assertTrue((map_file.images == generator.images).all())
+        self.assertEqual(map_file.get_tile_type(1), 'road')
+        map_file.close()
+
+    def test_no_seed(self):
+        types = numpy.zeros(5*5 + 1, dtype=numpy.uint8)
+        for seed in (None, 0):
+            save_map(self.path, 5, 5, seed, types, types)
+            map_file = MapFile(self.path)
+            self.assertEqual(map_file.seed, seed, "Seed 0 and no seed should be told apart")
+            map_file.close()
+
+    def test_not_a_map(self):
+        with open(self.path, 'wb') as bad_file:
+            bad_file.write(b'PNG' + bytes(40))
+        self.assertRaises(ValueError, MapFile, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#
+# map_generator_class - generates the city (road and buildings) as arrays of
+#                       tile types, from a seed, so the same seed always gives
+#                       the same map
+#
+
+import random
+import unittest
+import numpy
+from game_constants import *
+from tile_class import IMAGE_LIST, EMPTY, ROAD, CITY, TILE_TYPES
+import grid_search_class
+
+
+class MapGenerator():
+    ''' MapGenerator class : lays a road from tile 1 to the last tile, with side roads
+                             from the other two corners, and fills the rest with buildings
+
+        : attributes:   tiles - number of tiles along a side of the map
+                        seed - the seed the map was generated from. None picks a random
+                        one, which is kept here so the map can be made again
+                        types - numpy array of tile type codes, types[tile_no] (slot 0 unused)
+                        images - index into IMAGE_LIST of each city tile's building
+                        road - road tile numbers, in the order they were laid
+                        grid - GridSearch over the blank map, used for every road segment
+
+        : methods:      generate() - draw_road() then draw_buildings()
+                        draw_road() - fill self.road and mark its tiles ROAD
+                        draw_buildings() - mark every other tile CITY and pick its image
+    '''
+
+    def __init__(self, tiles=TILES, seed=None):
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.tiles = tiles
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.types = numpy.full(tiles*tiles + 1, EMPTY, dtype=numpy.uint8)
+        self.images = numpy.zeros(tiles*tiles + 1, dtype=numpy.uint8)
+        self.road = []
+        # every tile is an empty lot while the road is planned, all equally cheap
+        self.grid = grid_search_class.GridSearch(tiles)
+        self.grid.min_walkability = 1
+
+
+    def generate(self):
+        self.draw_road()
+        self.draw_buildings()
+        return self
+
+
+    def draw_road(self):
+        """ Roads are created by using the A-Star algorithm. We get a "path" from
+            a start tile to the "next" tile (generated randomly). The tiles along
+            this path are converted to 'road' type.
+        """
+        tiles = self.tiles
+        # road_dist_x is a list of distances to the next tile along x-axis
+        road_dist_x = list(range(0, tiles//2))
+        # road_dist_y is a list of distances to the next tile along y-axis
+        road_dist_y = list(range(0, tiles*tiles//2, tiles))
+
+        # the distances are used to get the next tile = start + dist_x + dist_y
+        #                                  ex. next_tile = 1 + 3 + 30 = 34
+        # we only look at half the possible distances (tiles//2 or tiles*tiles//2)
+        # because we don't want to get the tiles further than the max, tiles*tiles
+        self.random.shuffle(road_dist_x)
+        self.random.shuffle(road_dist_y)
+        start_tile = 1
+
+        while len(road_dist_x) > 0:
+            next_tile = start_tile + road_dist_x.pop() + road_dist_y.pop()
+            # If the starting tile is in the top row, the next tile should be last tile
+            if start_tile > tiles*(tiles-1):
+                next_tile = tiles*tiles
+            # If the next tile is to the left of the start tile, go up a row (so road doesn't wrap on itself)
+            if next_tile%tiles < start_tile%tiles:
+                next_tile += tiles
+            # if the next tile is higher than the max possible tile, reset it to the max tile
+            if next_tile > tiles*tiles:
+                next_tile = tiles*tiles
+
+            self.draw_road_segment(start_tile, next_tile)
+            start_tile = next_tile
+
+        # Remove the repeated tiles, keeping the order they were laid in
+        self.road = list(dict.fromkeys(self.road))
+        # We want road segments to connect to the main road from the 2 other corners too
+        # First we connect the bottom right corner to a lower part of the road (look at the first half of the list)
+        self.draw_road_segment(tiles, self.random.choice(self.road[:len(self.road)//2]))
+        # Then we connect the top left corner to a higher part of the road (second half of the list)
+        self.draw_road_segment(tiles*(tiles-1) + 1, self.random.choice(self.road[len(self.road)//2:]))
+        self.road = list(dict.fromkeys(self.road))
+        self.types[self.road] = ROAD
+
+
+    def draw_road_segment(self, start_tile, next_tile):
+        """ Append the path from the start tile to the next tile to self.road """
+        self.grid.search(start_tile, next_tile)
+        segment = self.grid.get_path()
+        segment.reverse()
+        self.road += segment
+
+
+    def draw_buildings(self):
+        """ Set tiles which are not part of the road to buildings """
+        buildings = self.types != ROAD
+        buildings[0] = False
+        self.types[buildings] = CITY
+        image_random = numpy.random.default_rng(self.seed)
+        self.images[buildings] = image_random.integers(0, len(IMAGE_LIST), int(buildings.sum()))
+
+
+    def get_tile_type(self, tile_no):
+        return TILE_TYPES[self.types[tile_no]]
+
+
+    def get_img_path(self, tile_no):
+        ''' The building image of a city tile, "" for anything else '''
+        if self.types[tile_no] != CITY:
+            return ""
+        return 'artwork/' + IMAGE_LIST[self.images[tile_no]]
+
+
+class TestMapGenerator(unittest.TestCase):
+    def test_same_seed_same_map(self):
+        first = MapGenerator(seed=42).generate()
+        second = MapGenerator(seed=42).generate()
+        self.assertEqual(first.road, second.road)
+        self.assertTrue((first.types == second.types).all())
+        self.assertTrue((first.images == second.images).all())
+        self.assertEqual(MapGenerator(seed=first.seed).generate().road, first.road)
+
+    def test_road_connects_corners(self):
+        generator = MapGenerator(tiles=40, seed=7).generate()
+        road = set(generator.road)
+        self.assertEqual(sorted(road), [tile_no for tile_no in range(1, 40*40+1) if generator.types[tile_no] == ROAD])
+        self.assertEqual(int((generator.types == CITY).sum()), 40*40 - len(road))
+        # every road tile can be reached from tile 1 along the road
+        reached, to_visit = {1}, [1]
+        while to_visit:
+            for next_no in generator.grid.get_surrounding_tiles(to_visit.pop()):
+                if next_no in road and next_no not in reached:
+                    reached.add(next_no)
+                    to_visit.append(next_no)
+        self.assertEqual(reached, road)
+        for corner in (1, 40, 40*39 + 1, 40*40):
+            self.assertTrue(corner in road, "Road doesn't reach corner tile {0}".format(corner))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#
+# path_cache_class - remembers the paths already found on the current map,
+#                    so asking for the same start and target again is free
+#
+
+from collections import OrderedDict
+from game_constants import *
+import unittest
+
+
+class PathCache():
+    ''' PathCache class : paths keyed by (start, target, map version)
+
+        : attributes:   max_paths - how many paths to keep. When full, the least
+                        recently used one is dropped (None = no limit)
+                        paths - (start, target, version): tuple of tile numbers
+                        version - the map version the stored paths belong to
+                        hits, misses - lookups answered from / not found in the cache
+
+        : methods:      get_path(start, target, version, search) - the stored path,
+                        or search(start, target) stored and returned on a miss
+
+        The map version is bumped whenever a tile changes type (see
+        LevelMap.version). Paths found on an older version can never be asked
+        for again, so they are all dropped the first time a newer version is seen.
+    '''
+
+    def __init__(self, max_paths=1024):
+        self.max_paths = max_paths
+        self.paths = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+
+    def get_path(self, start, target, version, search):
+        if version != self.version:
+            self.paths.clear()
+            self.version = version
+        key = (start, target, version)
+        path = self.paths.get(key)
+        if path is not None:
+            self.hits += 1
+            self.paths.move_to_end(key)
+            return list(path)
+
+        self.misses += 1
+        path = search(start, target)
+        self.paths[key] = tuple(path)
+        if self.max_paths is not None and len(self.paths) > self.max_paths:
+            self.paths.popitem(last=False)
+        return list(path)
+
+
+    def clear(self):
+        self.paths.clear()
+
+
+class TestPathCache(unittest.TestCase):
+    def setUp(self):
+        self.searches = []
+        self.test_cache = PathCache(max_paths=2)
+
+    def search(self, start, target):
+        self.searches.append((start, target))
+        return [start, target]
+
+    def test_hits_and_misses(self):
+        self.assertEqual(self.test_cache.get_path(1, 5, 0, self.search), [1, 5])
+        self.test_cache.get_path(1, 5, 0, self.search).reverse()
+        self.assertEqual(self.test_cache.get_path(1, 5, 0, self.search), [1, 5],
+                            "Changing a returned path should not change the stored one")
+        self.assertEqual((self.test_cache.hits, self.test_cache.misses), (2, 1))
+        self.assertEqual(self.searches, [(1, 5)])
+
+    def test_eviction_and_version(self):
+        for target in (2, 3, 2, 4):
+            self.test_cache.get_path(1, target, 0, self.search)
+        self.assertEqual(list(self.test_cache.paths), [(1, 2, 0), (1, 4, 0)])
+        self.test_cache.get_path(1, 2, 1, self.search)
+        self.assertEqual(list(self.test_cache.paths), [(1, 2, 1)])
+        self.assertEqual(self.test_cache.misses, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+#
+# path_pool_class - answers batches of path queries on a pool of worker
+#                   processes, which all read the map's walkability from one
+#                   shared memory array
+#
+
+import multiprocessing
+from multiprocessing import shared_memory, util
+import unittest
+import numpy
+from game_constants import *
+import grid_search_class
+import jump_point_class
+
+# the search each worker process runs, set up by init_worker()
+worker_memory = None
+worker_search = None
+
+
+def init_worker(memory_name, tiles, search_class):
+    ''' Attach the worker to the shared walkability array and give it a search over it.
+        The block is closed again when the worker process exits '''
+    global worker_memory, worker_search
+    worker_memory = shared_memory.SharedMemory(name=memory_name)
+    worker_search = search_class(tiles)
+    worker_search.walkability = numpy.ndarray((tiles*tiles + 1,), dtype=numpy.int64, buffer=worker_memory.buf)
+    util.Finalize(None, close_worker, exitpriority=10)
+
+
+def close_worker():
+    ''' Let go of the shared walkability array, the search first as it views into it '''
+    global worker_memory, worker_search
+    worker_search = None
+    if worker_memory is not None:
+        worker_memory.close()
+        worker_memory = None
+
+
+def run_query(query):
+    ''' (index, path) for the query (index, start, target), the path start first or [] '''
+    index, start, target = query
+    if not worker_search.search(start, target):
+        return (index, [])
+    path = worker_search.get_path()
+    path.reverse()
+    return (index, path)
+
+
+class PathPool():
+    ''' PathPool class : a process pool for many independent path queries on one map
+
+        : attributes:   tiles - number of tiles along a side of the map
+                        memory - the SharedMemory block holding the walkability
+                        walkability - numpy view of it, walkability[tile_no] (slot 0
+                        unused). The workers search this very array, so writing to it
+                        (or calling update_tiles) changes the map for the next queries
+                        pool - the worker processes, each with its own search_class
+                        search (GridSearch by default, or e.g. JumpPointSearch)
+
+        : methods:      imap_paths(queries) - (index, path) per (start, target) query, in
+                        the order they finish, as soon as each one finishes
+                        find_paths(queries) - list of paths, in query order
+                        update_tiles(tile_nos, walkability) - change tiles' walkability
+                        close() - wait for the workers to exit and free the shared memory. A
+                        PathPool is also a context manager that closes itself
+
+        Only the query and the path cross between processes, never the map.
+    '''
+
+    def __init__(self, walkability, tiles=TILES, processes=None, search_class=grid_search_class.GridSearch):
+        self.tiles = tiles
+        size = tiles*tiles + 1
+        self.memory = shared_memory.SharedMemory(create=True, size=size*numpy.dtype(numpy.int64).itemsize)
+        self.walkability = numpy.ndarray((size,), dtype=numpy.int64, buffer=self.memory.buf)
+        self.walkability[0] = 0
+        self.walkability[1:] = walkability
+        self.processes = processes or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.processes, initializer=init_worker,
+                                         initargs=(self.memory.name, tiles, search_class))
+
+
+    @classmethod
+    def from_level_map(cls, level_map, processes=None, search_class=grid_search_class.GridSearch):
+        return cls(level_map.get_grid_search().walkability[1:], level_map.tiles, processes, search_class)
+
+
+    def imap_paths(self, queries, chunksize=None):
+        queries = [(index, start, target) for index, (start, target) in enumerate(queries)]
+        if chunksize is None:
+            # a few chunks per worker: small enough to balance, big enough to batch
+            chunksize = max(1, len(queries) // (self.processes*4))
+        return self.pool.imap_unordered(run_query, queries, chunksize)
+
+
+    def find_paths(self, queries, chunksize=None):
+        paths = [None]*len(queries)
+        for index, path in self.imap_paths(queries, chunksize):
+            paths[index] = path
+        return paths
+
+
+    def update_tiles(self, tile_nos, walkability):
+        ''' Only safe between batches: queries already running may see either value '''
+        self.walkability[tile_nos] = walkability
+
+
+    def close(self):
+        if self.pool is not None:
+            # let the workers exit on their own, so they close their shared memory
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            self.walkability = None
+            self.memory.close()
+            self.memory.unlink()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class TestPathPool(unittest.TestCase):
+    def setUp(self):
+        import map_class
+        self.test_map = map_class.LevelMap(tiles=20, headless=True)
+        self.test_map.map_creator(seed=2)
+        rng = numpy.random.default_rng(2)
+        self.queries = [tuple(int(n) for n in rng.integers(1, 401, 2)) for i in range(40)]
+
+    def test_same_paths(self):
+        with PathPool.from_level_map(self.test_map, processes=2) as path_pool:
+            streamed = dict(path_pool.imap_paths(self.queries))
+            self.assertEqual(sorted(streamed), list(range(len(self.queries))))
+            self.assertEqual(path_pool.find_paths(self.queries),
+                             [self.test_map.search_path(start, target) for start, target in self.queries])
+
+    def test_update_tiles(self):
+        with PathPool(numpy.ones(100), 10, processes=2) as path_pool:
+            self.assertEqual(path_pool.find_paths([(1, 3)]), [[1, 2, 3]])
+            path_pool.update_tiles([2], 100)
+            self.assertEqual(path_pool.find_paths([(1, 3)]), [[1, 11, 12, 13, 3]],
+                             "Workers should see tiles changed in the shared walkability")
+
+    def test_jump_point_workers(self):
+        grid_search = self.test_map.get_grid_search()
+        with PathPool(grid_search.walkability[1:], 20, 2, jump_point_class.JumpPointSearch) as path_pool:
+            for (start, target), path in zip(self.queries, path_pool.find_paths(self.queries)):
+                grid_search.search(start, target)
+                self.assertEqual(grid_search.get_cost(path[::-1]), grid_search.get_cost(grid_search.get_path()))
+
+
+if __name__ == '__main__':
+    unittest.main()
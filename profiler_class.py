@@ -0,0 +1,181 @@
+#
+# profiler_class - per-frame timings of the game loop phases and counters for
+#                  the hot paths (nodes expanded, tiles drawn, blits, ...), with
+#                  an on-screen overlay and dumps to CSV or JSON
+#
+
+import csv
+import json
+import os
+import tempfile
+import time
+import unittest
+import pygame
+from collections import deque
+from game_constants import *
+
+
+class NullScope():
+    ''' What Profiler.scope() hands out while the profiler is off: does nothing '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SCOPE = NullScope()
+
+
+class Scope():
+    ''' Times the block it is used on and adds the time to the profiler's frame '''
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler():
+    ''' Profiler class : collects named timings and counters for the current frame
+
+        : attributes:   enabled - when False, scope() and count() do nothing
+                        frame - name: value for the frame in progress. Timings are in
+                        milliseconds, counters are plain counts
+                        history - the last history_frames finished frames, oldest first
+                        dump_path - if set, history is written there every dump_every
+                        frames, as CSV if the name ends in .csv and JSON otherwise
+                        frames - number of frames finished
+                        font - the overlay's font, made the first time it is drawn
+
+        : methods:      scope(name) - with profiler.scope('draw_tiles'): ... times a block
+                        count(name, n) - add n to a counter
+                        end_frame() - move the current frame into history
+                        draw_overlay(surface) - the last frame, drawn on surface
+                        dump(path) - write history to a CSV or JSON file
+    '''
+
+    def __init__(self, enabled=False, history_frames=300, dump_path=None, dump_every=300):
+        self.enabled = enabled
+        self.frame = {}
+        self.history = deque(maxlen=history_frames)
+        self.dump_path = dump_path
+        self.dump_every = dump_every
+        self.frames = 0
+        self.font = None
+
+
+    def scope(self, name):
+        if not self.enabled:
+            return NULL_SCOPE
+        return Scope(self, name)
+
+
+    def add_time(self, name, seconds):
+        self.frame[name] = self.frame.get(name, 0) + seconds*1000
+
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.frame[name] = self.frame.get(name, 0) + n
+
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.frame['frame'] = self.frames
+        self.history.append(self.frame)
+        self.frame = {}
+        self.frames += 1
+        if self.dump_path and self.frames % self.dump_every == 0:
+            self.dump(self.dump_path)
+
+
+    def draw_overlay(self, surface, x=5, y=5):
+        ''' Draw the values of the last finished frame, one per line. The numbers
+            change every frame, so they are rendered with the profiler's own font
+            rather than going through (and filling up) a TextCache '''
+        if not self.history:
+            return
+        if self.font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            self.font = pygame.font.SysFont('monospace', 12)
+        last_frame = self.history[-1]
+        for name in sorted(last_frame):
+            value = last_frame[name]
+            if isinstance(value, float):
+                line = "{0:>14} {1:8.2f} ms".format(name, value)
+            else:
+                line = "{0:>14} {1:8d}".format(name, value)
+            label = self.font.render(line, True, YELLOW)
+            surface.fill(BLACK, (x, y, label.get_width(), label.get_height()))
+            surface.blit(label, (x, y))
+            y += label.get_height()
+
+
+    def dump(self, path):
+        frames = list(self.history)
+        if path.endswith('.csv'):
+            names = sorted(set(name for frame in frames for name in frame) - set(['frame']))
+            with open(path, 'w', newline='') as dump_file:
+                writer = csv.DictWriter(dump_file, ['frame'] + names, restval=0)
+                writer.writeheader()
+                writer.writerows(frames)
+        else:
+            with open(path, 'w') as dump_file:
+                json.dump(frames, dump_file)
+
+
+# the profiler the game loop and the hot paths report to. It is off until
+# something turns it on, e.g. the 'p' key in map_class.main()
+PROFILER = Profiler()
+
+
+class TestProfiler(unittest.TestCase):
+    def test_disabled(self):
+        profiler = Profiler()
+        with profiler.scope('draw_tiles'):
+            profiler.count('tiles_drawn', 10)
+        profiler.end_frame()
+        self.assertEqual((profiler.frame, len(profiler.history)), ({}, 0))
+
+    def test_frames_and_dump(self):
+        profiler = Profiler(enabled=True, history_frames=2)
+        for frame in range(3):
+            with profiler.scope('draw_tiles'):
+                profiler.count('tiles_drawn', frame)
+            profiler.end_frame()
+        self.assertEqual([frame['tiles_drawn'] for frame in profiler.history], [1, 2])
+        self.assertTrue(profiler.history[-1]['draw_tiles'] >= 0)
+
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        os.close(handle)
+        profiler.dump(path)
+        with open(path) as dump_file:
+            rows = list(csv.DictReader(dump_file))
+        self.assertEqual([row['frame'] for row in rows], ['1', '2'])
+        profiler.dump(path[:-4] + '.json')
+        with open(path[:-4] + '.json') as dump_file:
+            self.assertEqual(json.load(dump_file), list(profiler.history))
+        os.remove(path)
+        os.remove(path[:-4] + '.json')
+
+    def test_overlay(self):
+        profiler = Profiler(enabled=True)
+        profiler.count('tiles_drawn', 5)
+        profiler.end_frame()
+        surface = pygame.Surface((200, 50))
+        profiler.draw_overlay(surface)
+        self.assertTrue(pygame.transform.average_color(surface)[:3] != (0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
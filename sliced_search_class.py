@@ -0,0 +1,110 @@
+#
+# sliced_search_class - a path search run a slice at a time, a node or time
+#                       budget per frame, so a long query never stalls the game loop
+#
+
+import time
+import unittest
+import numpy
+from game_constants import *
+import grid_search_class
+
+SEARCHING = 'searching'
+FOUND = 'found'
+NO_PATH = 'no path'
+
+
+class SlicedSearch():
+    ''' SlicedSearch class : one query from start to target, resumable across frames
+
+        : attributes:   search - the GridSearch running the query. It has its own search
+                        arrays but shares the walkability array of the GridSearch it
+                        was made from, so other searches can run in between slices
+                        max_nodes, max_microseconds - the budget of each step(), either
+                        or both (with neither a step runs the search to the end)
+                        state - SEARCHING, FOUND or NO_PATH
+                        steps - number of step() calls so far
+
+        : methods:      step() - run one slice, returns the state
+                        get_path() - the path, start first: the whole path once FOUND,
+                        until then the path to the tile nearest the target found so
+                        far, so a unit can set off straight away
+
+        A map change doesn't reach a search in progress: start a new one when
+        LevelMap.version changes.
+    '''
+
+    def __init__(self, grid_search, start, target, max_nodes=None, max_microseconds=None):
+        self.search = grid_search_class.GridSearch(grid=grid_search.grid, diagonal=grid_search.diagonal)
+        self.search.walkability = grid_search.walkability
+        self.search.min_walkability = grid_search.min_walkability
+        self.search.begin_search(start, target)
+        self.max_nodes = max_nodes
+        self.max_microseconds = max_microseconds
+        self.state = SEARCHING
+        self.steps = 0
+
+
+    def step(self):
+        if self.state != SEARCHING:
+            return self.state
+        deadline = None
+        if self.max_microseconds is not None:
+            deadline = time.perf_counter() + self.max_microseconds/1000000
+        found = self.search.continue_search(self.max_nodes, deadline)
+        self.steps += 1
+        if found is not None:
+            self.state = FOUND if found else NO_PATH
+        return self.state
+
+
+    def get_path(self):
+        if self.state == FOUND:
+            path = self.search.get_path()
+        else:
+            path = self.search.get_path(self.search.best_tile)
+        path.reverse()
+        return path
+
+
+class TestSlicedSearch(unittest.TestCase):
+    def setUp(self):
+        self.tiles = 40
+        walkability = numpy.ones(self.tiles*self.tiles, dtype=numpy.int64)
+        walkability[numpy.random.default_rng(3).random(walkability.size) < 0.3] = 20
+        self.grid_search = grid_search_class.GridSearch(self.tiles, walkability)
+
+    def test_same_path_in_slices(self):
+        target = self.tiles*self.tiles
+        self.grid_search.search(1, target)
+        whole_path = self.grid_search.get_path()[::-1]
+
+        sliced = SlicedSearch(self.grid_search, 1, target, max_nodes=25)
+        partial_lengths = []
+        while sliced.step() == SEARCHING:
+            path = sliced.get_path()
+            self.assertEqual(path[0], 1)
+            partial_lengths.append(len(path))
+            self.assertTrue(sliced.search.nodes_expanded <= 25*sliced.steps)
+            # other searches can run on the same map in between slices
+            self.grid_search.search(target, 1)
+        self.assertTrue(sliced.steps > 1 and max(partial_lengths) > 1)
+        self.assertEqual(sliced.state, FOUND)
+        self.assertEqual(sliced.get_path(), whole_path)
+
+    def test_time_budget(self):
+        sliced = SlicedSearch(self.grid_search, 1, self.tiles*self.tiles, max_microseconds=200)
+        while sliced.step() == SEARCHING:
+            pass
+        self.assertEqual(sliced.get_path()[-1], self.tiles*self.tiles)
+
+    def test_tiny_time_budget(self):
+        for max_microseconds in (0, 1):
+            sliced = SlicedSearch(self.grid_search, 1, self.tiles*self.tiles, max_microseconds=max_microseconds)
+            while sliced.step() == SEARCHING:
+                self.assertTrue(sliced.search.nodes_expanded >= 16*sliced.steps)
+            self.assertEqual(sliced.get_path()[-1], self.tiles*self.tiles)
+
+
+if __name__ == '__main__':
+    unittest.main()
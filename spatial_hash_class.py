@@ -0,0 +1,150 @@
+#
+# spatial_hash_class - a uniform grid of cells over world coordinates, so what
+#                      is near a point, or touching what, is found by looking in a
+#                      few cells instead of testing every pair of things
+#
+
+import unittest
+import numpy
+from game_constants import *
+
+# cell coordinates are packed into one int64 key, offset so negative ones work
+CELL_OFFSET = 1 << 20
+CELL_SPAN = 1 << 21
+
+
+class SpatialHash():
+    ''' SpatialHash class : points bucketed by the cell_size x cell_size cell they are in.
+                            It is rebuilt from arrays each tick rather than updated as
+                            things move: the points are sorted by cell key, and a cell's
+                            points are found with a binary search on the keys
+
+        : attributes:   cell_size - side of a cell in pixels, best about the size of the
+                        largest thing in it (pairs() still works if things are bigger)
+                        indices - the ids of the points (e.g. unit indices), sorted by cell
+                        keys, cells, positions, radii - cell key, cell column and row,
+                        position and radius of each of them, in the same order
+
+        : methods:      build(positions, radii, indices) - bucket a new set of points
+                        query(x, y, radius) - ids of the points within radius of x, y
+                        pairs() - every pair of ids whose circles overlap, as two arrays
+    '''
+
+    def __init__(self, cell_size=TILESIZE):
+        self.cell_size = cell_size
+        self.indices = numpy.zeros(0, dtype=numpy.int64)
+        self.keys = numpy.zeros(0, dtype=numpy.int64)
+        self.cells = numpy.zeros((0, 2), dtype=numpy.int64)
+        self.positions = numpy.zeros((0, 2))
+        self.radii = numpy.zeros(0)
+
+
+    def get_keys(self, cells):
+        return (cells[..., 0] + CELL_OFFSET)*CELL_SPAN + (cells[..., 1] + CELL_OFFSET)
+
+
+    def build(self, positions, radii, indices=None):
+        ''' positions - (n, 2) array of x, y, radii - n radii (or one for all),
+            indices - the n ids handed back by query() and pairs(), 0..n-1 by default '''
+        positions = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 2)
+        radii = numpy.broadcast_to(numpy.asarray(radii, dtype=numpy.float64), len(positions))
+        if indices is None:
+            indices = numpy.arange(len(positions))
+        cells = numpy.floor(positions/self.cell_size).astype(numpy.int64)
+        keys = self.get_keys(cells)
+        order = numpy.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.cells = cells[order]
+        self.positions = positions[order]
+        self.radii = radii[order]
+        self.indices = numpy.asarray(indices, dtype=numpy.int64)[order]
+
+
+    def __len__(self):
+        return len(self.keys)
+
+
+    def query(self, x, y, radius):
+        ''' ids of the points no further than radius from x, y '''
+        size = self.cell_size
+        first_col, last_col = int(numpy.floor((x - radius)/size)), int(numpy.floor((x + radius)/size))
+        first_row, last_row = int(numpy.floor((y - radius)/size)), int(numpy.floor((y + radius)/size))
+        found = []
+        for col in range(first_col, last_col+1):
+            # a column of cells is one run of keys
+            first_key = self.get_keys(numpy.array([col, first_row]))
+            last_key = self.get_keys(numpy.array([col, last_row]))
+            start = numpy.searchsorted(self.keys, first_key, 'left')
+            end = numpy.searchsorted(self.keys, last_key, 'right')
+            found.append(numpy.arange(start, end))
+        found = numpy.concatenate(found)
+        offsets = self.positions[found] - (x, y)
+        near = (offsets*offsets).sum(axis=1) <= radius*radius
+        return self.indices[found[near]]
+
+
+    def pairs(self):
+        ''' (firsts, seconds), arrays of the ids of every pair of points whose circles
+            overlap, each pair once '''
+        count = len(self.keys)
+        if count < 2:
+            return (numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64))
+        # how many cells away two touching points can be
+        reach = max(1, int(numpy.ceil(2*self.radii.max()/self.cell_size)))
+        everyone = numpy.arange(count)
+        firsts, seconds = [], []
+        for dcol in range(0, reach+1):
+            for drow in range(-reach, reach+1):
+                # half of the cells around each point: the other half are looked
+                # at from the points in those cells
+                if dcol == 0 and drow < 0:
+                    continue
+                keys = self.get_keys(self.cells + (dcol, drow))
+                starts = numpy.searchsorted(self.keys, keys, 'left')
+                counts = numpy.searchsorted(self.keys, keys, 'right') - starts
+                # every point paired with every point of its neighbour cell, as
+                # positions in the sorted arrays
+                first = numpy.repeat(everyone, counts)
+                second = (numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+                          + numpy.repeat(starts, counts))
+                if dcol == 0 and drow == 0:
+                    keep = first < second
+                    first, second = first[keep], second[keep]
+                firsts.append(first)
+                seconds.append(second)
+        first = numpy.concatenate(firsts)
+        second = numpy.concatenate(seconds)
+        offsets = self.positions[first] - self.positions[second]
+        reach = self.radii[first] + self.radii[second]
+        touching = (offsets*offsets).sum(axis=1) < reach*reach
+        return (self.indices[first[touching]], self.indices[second[touching]])
+
+
+class TestSpatialHash(unittest.TestCase):
+    def setUp(self):
+        rng = numpy.random.default_rng(5)
+        self.positions = rng.uniform(-300, 900, (400, 2))
+        self.radii = rng.uniform(2, 60, 400)
+        self.spatial_hash = SpatialHash(cell_size=40)
+        self.spatial_hash.build(self.positions, self.radii, numpy.arange(400) + 1000)
+
+    def test_query(self):
+        for x, y, radius in ((0, 0, 100), (450, 120, 35), (-500, -500, 10), (300, 300, 400)):
+            distances = numpy.hypot(*(self.positions - (x, y)).T)
+            self.assertEqual(sorted(self.spatial_hash.query(x, y, radius)),
+                             list(numpy.flatnonzero(distances <= radius) + 1000))
+
+    def test_pairs_match_pairwise(self):
+        firsts, seconds = self.spatial_hash.pairs()
+        found = sorted((min(a, b), max(a, b)) for a, b in zip(firsts.tolist(), seconds.tolist()))
+        expected = []
+        for a in range(400):
+            for b in range(a+1, 400):
+                if numpy.hypot(*(self.positions[a] - self.positions[b])) < self.radii[a] + self.radii[b]:
+                    expected.append((a + 1000, b + 1000))
+        self.assertEqual(found, expected)
+        self.assertEqual(SpatialHash().pairs()[0].size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,33 @@ import random
 import unittest
 
 IMAGE_LIST = ['building1.png', 'building2.png', 'building3.png', 'building4.png']
+TILE_COLORS = {'empty': WHITE, 'city': BLUE, 'road': GRAY}
+
+# tile types are stored as these codes in arrays, TILE_TYPES[code] is the type name
+EMPTY = 0
+ROAD = 1
+CITY = 2
+TILE_TYPES = ['empty', 'road', 'city']
+
+
+class TileType():
+    ''' TileType class : what every tile of one type has in common, kept once per
+                         type instead of once per tile (a flyweight)
+
+        attributes: name - the tile type, 'empty', 'road' or 'city'
+                    color, walkability - from TILE_COLORS and TILE_WALKABILITY
+                    img_paths - the images a tile of this type can be drawn with
+    '''
+    __slots__ = ('name', 'color', 'walkability', 'img_paths')
+
+    def __init__(self, name):
+        self.name = name
+        self.color = TILE_COLORS[name]
+        self.walkability = TILE_WALKABILITY[name]
+        self.img_paths = ['artwork/' + img for img in IMAGE_LIST] if name == 'city' else []
+
+
+TILE_KINDS = {name: TileType(name) for name in TILE_WALKABILITY}
 
 
 class Tile(pygame.Rect):
@@ -48,34 +75,26 @@ class Tile(pygame.Rect):
 
 
     def set_walkability(self):
-        if self.type is 'empty':
-            self.walkability = 20
-        elif self.type is 'city':
-            self.walkability = 100
-        elif self.type is 'road':
-            self.walkability = 1
+        if self.type in TILE_KINDS:
+            self.walkability = TILE_KINDS[self.type].walkability
 
 
     def set_images(self):
         ''' Sets the color of the tile depending on what its type is
             Used for testing before the actual image is introduced '''
-        if self.type is 'empty':
+        if self.type == 'empty':
             self.img_path = ""
-        elif self.type is 'city':
+        elif self.type == 'city':
             self.img_path = 'artwork/' + random.choice(IMAGE_LIST)
-        elif self.type is 'road':
+        elif self.type == 'road':
             self.img_path = ""
 
 
     def set_colors(self):
         ''' Sets the color of the tile depending on what its type is
             Used for testing before the actual image is introduced '''
-        if self.type is 'empty':
-            self.color = WHITE
-        elif self.type is 'city':
-            self.color = BLUE
-        elif self.type is 'road':
-            self.color = GRAY
+        if self.type in TILE_KINDS:
+            self.color = TILE_KINDS[self.type].color
 
     def get_tile_info(self):
         ''' Returns the tile information as a tuple '''
@@ -0,0 +1,178 @@
+#
+# tile_store_class - compact tile storage for very large maps: one byte of type
+#                    and one of image per tile in numpy arrays, with the per-type
+#                    data shared and tile objects only made when asked for
+#
+
+import random
+import tracemalloc
+import unittest
+import numpy
+import pygame
+from game_constants import *
+from tile_class import Tile, IMAGE_LIST, TILE_KINDS, EMPTY, CITY, TILE_TYPES
+import grid_class
+
+# type code -> shared TileType, and the walkability of each code for whole-map lookups
+KINDS_BY_CODE = [TILE_KINDS[name] for name in TILE_TYPES]
+WALKABILITY_BY_CODE = numpy.array([kind.walkability for kind in KINDS_BY_CODE], dtype=numpy.int64)
+
+
+class TileView():
+    ''' TileView class : a tile of a TileStore, looked at through the same attributes
+                         as a Tile (number, type, color, walkability, img_path, x, y,
+                         width, height) so the map code can use either. Everything
+                         but the number is read from, or written to, the store
+
+        methods:    get_rect() - a pygame.Rect of the tile, made on demand
+                    set_colors(), set_walkability() - nothing to do, kept so code
+                    written for Tile works. set_images() picks a random building
+    '''
+    __slots__ = ('store', 'number')
+
+    width = TILESIZE
+    height = TILESIZE
+
+    def __init__(self, store, number):
+        self.store = store
+        self.number = number
+
+    @property
+    def kind(self):
+        return KINDS_BY_CODE[self.store.types[self.number]]
+
+    @property
+    def type(self):
+        return self.kind.name
+
+    @type.setter
+    def type(self, tile_type):
+        self.store.types[self.number] = TILE_TYPES.index(tile_type)
+
+    @property
+    def color(self):
+        return self.kind.color
+
+    @property
+    def walkability(self):
+        return self.kind.walkability
+
+    @property
+    def img_path(self):
+        img_paths = self.kind.img_paths
+        return img_paths[self.store.images[self.number]] if img_paths else ""
+
+    @img_path.setter
+    def img_path(self, img_path):
+        if img_path:
+            self.store.images[self.number] = self.kind.img_paths.index(img_path)
+
+    @property
+    def x(self):
+        return self.store.get_xy(self.number)[0]
+
+    @property
+    def y(self):
+        return self.store.get_xy(self.number)[1]
+
+    def get_rect(self):
+        return pygame.Rect(self.store.get_xy(self.number) + (self.width, self.height))
+
+    def set_colors(self):
+        pass
+
+    def set_walkability(self):
+        pass
+
+    def set_images(self):
+        if self.type == 'city':
+            self.store.images[self.number] = random.randrange(len(IMAGE_LIST))
+
+    def get_tile_info(self):
+        return (self.number, self.type)
+
+
+class TileStore():
+    ''' TileStore class : the tiles of a tiles x tiles map as typed arrays. It can
+                          stand in for LevelMap.tile_list: len() and indexing (tile_no-1)
+                          work as on the list, handing out TileViews
+
+        : attributes:   grid - Grid of the map
+                        types - numpy uint8 array of map_generator_class type codes,
+                        types[tile_no] (slot 0 unused)
+                        images - numpy uint8 array, IMAGE_LIST index of each city tile
+
+        : methods:      set_types(types, images) - copy in a whole map, e.g. from a
+                        MapGenerator or a MapFile
+                        get_walkability() - walkability of every tile as one array
+                        get_xy(tile_no) - world coordinates of the upper left corner
+    '''
+
+    def __init__(self, tiles=TILES, grid=None):
+        self.grid = grid if grid is not None else grid_class.get_grid(tiles)
+        self.tiles = self.grid.tiles
+        self.types = numpy.full(self.grid.tile_count + 1, EMPTY, dtype=numpy.uint8)
+        self.images = numpy.zeros(self.grid.tile_count + 1, dtype=numpy.uint8)
+
+
+    def __len__(self):
+        return self.grid.tile_count
+
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.grid.tile_count:
+            raise IndexError(index)
+        return TileView(self, index+1)
+
+
+    def __iter__(self):
+        for tile_no in range(1, self.grid.tile_count + 1):
+            yield TileView(self, tile_no)
+
+
+    def set_types(self, types, images):
+        self.types[:] = types
+        self.images[:] = images
+
+
+    def get_walkability(self):
+        return WALKABILITY_BY_CODE[self.types]
+
+
+    def get_xy(self, tile_no):
+        ''' The x, y LevelMap.initialize_tiles gives the Tile with this number '''
+        col, row = self.grid.get_col_row(tile_no)
+        return (col*TILESIZE, WINDOWSIZE - (row+1)*TILESIZE)
+
+
+class TestTileStore(unittest.TestCase):
+    def test_views(self):
+        store = TileStore(tiles=10)
+        tile = store[10]
+        self.assertEqual((tile.number, tile.type, tile.walkability, tile.img_path), (11, 'empty', 20, ""))
+        self.assertEqual(tile.get_rect(), Tile('empty', 11, 0, WINDOWSIZE - 2*TILESIZE, TILESIZE, TILESIZE))
+        tile.type = 'city'
+        tile.img_path = 'artwork/' + IMAGE_LIST[2]
+        self.assertEqual((store.types[11], store.images[11]), (CITY, 2))
+        self.assertEqual((tile.color, tile.walkability), (BLUE, 100))
+        self.assertEqual(store.get_walkability()[10:13].tolist(), [20, 100, 20])
+        self.assertEqual(len(list(store)), 100)
+
+    def test_memory_per_tile(self):
+        tiles = 100
+        tracemalloc.start()
+        tile_list = [Tile('empty', n, 0, 0, TILESIZE, TILESIZE) for n in range(1, tiles*tiles+1)]
+        tile_bytes = tracemalloc.get_traced_memory()[0]
+        tile_list = None
+        tracemalloc.stop()
+        grid = grid_class.Grid(tiles)       # shared by every map of this size
+        tracemalloc.start()
+        store = TileStore(grid=grid)
+        store_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.assertTrue(store_bytes*10 < tile_bytes,
+                        "{0} bytes per tile is not much less than {1}".format(store_bytes/tiles**2, tile_bytes/tiles**2))
+
+
+if __name__ == '__main__':
+    unittest.main()
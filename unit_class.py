@@ -0,0 +1,278 @@
+#
+# unit_class - the tanks, missiles and the rest of the moving things on the map,
+#              held as numpy arrays and moved all together once a tick, with a
+#              spatial hash for who hits who
+#
+
+import unittest
+import numpy
+import pygame
+from game_constants import *
+import asset_class
+import camera_class
+import grid_class
+import spatial_hash_class
+import game_loop_class
+
+# unit kinds, and per kind: name, image, speed in pixels per second (VEL and
+# DRAGSPEED are pixels per tick) and collision radius
+DRAGON, TANK, MISSILE, BUILDING = 0, 1, 2, 3
+UNIT_NAMES = ['dragon', 'tank', 'missile', 'building']
+UNIT_IMAGES = ['artwork/zilla.png', 'artwork/tank.png', 'artwork/missile.png', None]
+UNIT_SPEEDS = numpy.array([DRAGSPEED, VEL, 4*VEL, 0], dtype=numpy.float64)*TICK_RATE
+UNIT_RADII = numpy.array([TILESIZE/2, TILESIZE/3, 6, TILESIZE/2], dtype=numpy.float64)
+
+
+class Units():
+    ''' Units class : every unit on a map. A unit is an index into the arrays, which
+                      hold one entry per unit, dead or alive, up to count. Dead slots
+                      are handed out again by add()
+
+        : attributes:   grid - Grid of the map the units are on
+                        kinds - numpy uint8 array, DRAGON, TANK, MISSILE or BUILDING
+                        alive - numpy bool array
+                        positions - (n, 2) float array of world x, y of each unit's centre
+                        previous_positions - where they were the tick before, for drawing
+                        between ticks (see draw())
+                        velocities - (n, 2) float array, pixels per second
+                        tile_nos - number of the tile each unit is on, 0 if off the map
+                        spatial_hash - SpatialHash of the live units, rebuilt every update()
+                        version - bumped whenever units are added, removed or move, or are drawn
+                        somewhere else because they stopped
+
+        : methods:      add(kind, positions, headings) - add units of a kind, returns
+                        their indices
+                        remove(indices)
+                        set_headings(indices, headings) - point units along headings, at
+                        the speed of their kind
+                        move_towards(indices, points) - the same, towards points
+                        update(tick_seconds) - move every unit one tick
+                        query(x, y, radius) - live units with their centre within radius
+                        collisions(kind, other_kind) - pairs of live units touching
+                        draw(surface, camera, images, alpha)
+
+        Units leaving the map stop at its edge, apart from missiles, which are removed.
+    '''
+
+    def __init__(self, tiles=TILES, grid=None, capacity=64):
+        self.grid = grid if grid is not None else grid_class.get_grid(tiles)
+        self.width = self.grid.tiles*TILESIZE
+        # world y of the bottom of the map, as Camera.bottom
+        self.bottom = WINDOWSIZE
+        self.count = 0
+        self.kinds = numpy.zeros(capacity, dtype=numpy.uint8)
+        self.alive = numpy.zeros(capacity, dtype=bool)
+        self.positions = numpy.zeros((capacity, 2))
+        self.previous_positions = numpy.zeros((capacity, 2))
+        self.velocities = numpy.zeros((capacity, 2))
+        self.tile_nos = numpy.zeros(capacity, dtype=numpy.int64)
+        self.spatial_hash = spatial_hash_class.SpatialHash(TILESIZE)
+        self.version = 0
+
+
+    def __len__(self):
+        return int(self.alive[:self.count].sum())
+
+
+    def get_live(self):
+        ''' Indices of the live units '''
+        return numpy.flatnonzero(self.alive[:self.count])
+
+
+    def grow(self, capacity):
+        ''' Make room for capacity units, doubling the arrays as often as needed '''
+        size = len(self.kinds)
+        if capacity <= size:
+            return
+        while size < capacity:
+            size *= 2
+        for name in ('kinds', 'alive', 'positions', 'previous_positions', 'velocities', 'tile_nos'):
+            array = getattr(self, name)
+            grown = numpy.zeros((size,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+
+    def add(self, kind, positions, headings=None):
+        ''' Add a unit of kind at each of positions ((n, 2) or a single x, y), moving
+            along headings (scaled to the kind's speed) or standing still '''
+        positions = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 2)
+        number = len(positions)
+        # dead slots first, then new ones at the end
+        free = numpy.flatnonzero(~self.alive[:self.count])[:number]
+        new = number - len(free)
+        self.grow(self.count + new)
+        indices = numpy.concatenate([free, numpy.arange(self.count, self.count + new)])
+        self.count += new
+        self.kinds[indices] = kind
+        self.alive[indices] = True
+        self.positions[indices] = positions
+        self.previous_positions[indices] = positions
+        self.velocities[indices] = 0
+        if headings is not None:
+            self.set_headings(indices, headings)
+        self.tile_nos[indices] = self.get_tile_nos(positions)
+        self.version += 1
+        return indices
+
+
+    def remove(self, indices):
+        self.alive[indices] = False
+        self.velocities[indices] = 0
+        self.version += 1
+
+
+    def set_headings(self, indices, headings):
+        headings = numpy.asarray(headings, dtype=numpy.float64).reshape(-1, 2)
+        lengths = numpy.hypot(headings[:, 0], headings[:, 1])
+        speeds = UNIT_SPEEDS[self.kinds[indices]]
+        # a zero heading stops the unit
+        scale = numpy.divide(speeds, lengths, out=numpy.zeros_like(lengths), where=lengths > 0)
+        self.velocities[indices] = headings*scale[:, None]
+
+
+    def move_towards(self, indices, points):
+        self.set_headings(indices, numpy.asarray(points, dtype=numpy.float64) - self.positions[indices])
+
+
+    def get_tile_nos(self, positions):
+        ''' Tile numbers under world positions, 0 off the map. As Camera.tile_at, but
+            for fractional positions '''
+        tiles = self.grid.tiles
+        cols = numpy.floor(positions[:, 0]/TILESIZE).astype(numpy.int64)
+        rows = numpy.ceil((self.bottom - positions[:, 1])/TILESIZE).astype(numpy.int64) - 1
+        on_map = (cols >= 0) & (cols < tiles) & (rows >= 0) & (rows < tiles)
+        return numpy.where(on_map, rows*tiles + cols + 1, 0)
+
+
+    def update(self, tick_seconds):
+        ''' Move every live unit one tick along its velocity, in one go '''
+        count = self.count
+        alive = self.alive[:count]
+        positions = self.positions[:count]
+        velocities = self.velocities[:count]
+        if not numpy.array_equal(self.previous_positions[:count][alive], positions[alive]):
+            # units drawn between their last two positions settle on the last one
+            self.version += 1
+        self.previous_positions[:count] = positions
+        moving = alive & velocities.any(axis=1)
+        if moving.any():
+            positions += velocities*tick_seconds
+            low = (0, self.bottom - self.width)
+            high = (self.width - 1e-6, self.bottom - 1e-6)
+            outside = alive & ((positions < low) | (positions > high)).any(axis=1)
+            if outside.any():
+                missiles = outside & (self.kinds[:count] == MISSILE)
+                alive[missiles] = False
+                velocities[outside] = 0
+                positions[outside] = numpy.clip(positions[outside], low, high)
+            self.tile_nos[:count] = self.get_tile_nos(positions)
+            self.version += 1
+        live = numpy.flatnonzero(alive)
+        self.spatial_hash.build(positions[live], UNIT_RADII[self.kinds[live]], live)
+
+
+    def query(self, x, y, radius):
+        return self.spatial_hash.query(x, y, radius)
+
+
+    def collisions(self, kind=None, other_kind=None):
+        ''' (firsts, seconds), arrays of the indices of every pair of live units that
+            touch, as of the last update(). With kinds given only pairs of a kind unit
+            (in firsts) and an other_kind unit (in seconds) '''
+        firsts, seconds = self.spatial_hash.pairs()
+        if kind is None:
+            return (firsts, seconds)
+        # put each pair the right way round, then keep the ones of the two kinds
+        swap = self.kinds[firsts] != kind
+        firsts, seconds = numpy.where(swap, seconds, firsts), numpy.where(swap, firsts, seconds)
+        keep = (self.kinds[firsts] == kind) & (self.kinds[seconds] == other_kind)
+        keep &= self.alive[firsts] & self.alive[seconds]
+        return (firsts[keep], seconds[keep])
+
+
+    def draw(self, surface, camera, images, alpha=1.0):
+        ''' Blit the live units in view, alpha of the way from where they were the
+            tick before to where they are now (see game_loop_class) '''
+        live = self.get_live()
+        positions = game_loop_class.interpolate(self.previous_positions[live], self.positions[live], alpha)
+        screen = positions - (camera.x, camera.y)
+        radii = UNIT_RADII[self.kinds[live]]
+        in_view = ((screen[:, 0] + radii >= 0) & (screen[:, 0] - radii < camera.width) &
+                   (screen[:, 1] + radii >= 0) & (screen[:, 1] - radii < camera.height))
+        blits = []
+        for index, (x, y) in zip(live[in_view].tolist(), screen[in_view].tolist()):
+            img_path = UNIT_IMAGES[self.kinds[index]]
+            if img_path is None:
+                continue
+            img = images.get(img_path)
+            blits.append((img, (x - img.get_width()/2, y - img.get_height()/2)))
+        surface.blits(blits, doreturn=False)
+        return len(blits)
+
+
+class TestUnits(unittest.TestCase):
+    def setUp(self):
+        self.units = Units(tiles=10)
+
+    def test_update(self):
+        tanks = self.units.add(TANK, [(40, WINDOWSIZE-40), (120, WINDOWSIZE-40)], [(1, 0), (0, -1)])
+        self.assertEqual(self.units.tile_nos[tanks].tolist(), [1, 2])
+        self.units.update(1/TICK_RATE)
+        self.assertEqual(self.units.positions[tanks].tolist(), [[40 + VEL, WINDOWSIZE-40], [120, WINDOWSIZE-40-VEL]])
+        for i in range(20):
+            self.units.update(1/TICK_RATE)
+        self.assertEqual(self.units.tile_nos[tanks].tolist(), [3, 22])
+        self.assertEqual(self.units.previous_positions[tanks[0]].tolist(), [40 + 20*VEL, WINDOWSIZE-40])
+
+    def test_edges(self):
+        tank = self.units.add(TANK, (5, WINDOWSIZE-10), (-1, 0))
+        missile = self.units.add(MISSILE, (5, WINDOWSIZE-10), (-1, 0))
+        self.units.update(1/TICK_RATE)
+        self.assertEqual(self.units.positions[tank].tolist(), [[0, WINDOWSIZE-10]], "A tank should stop at the edge")
+        self.assertEqual(len(self.units), 1, "A missile leaving the map should be gone")
+        self.assertEqual(self.units.add(MISSILE, (50, 50)).tolist(), missile.tolist(), "Dead slots should be reused")
+
+    def test_version_after_stopping(self):
+        self.units.add(TANK, (5, WINDOWSIZE-10), (-1, 0))
+        self.units.update(1/TICK_RATE)
+        version = self.units.version
+        self.units.update(1/TICK_RATE)
+        self.assertNotEqual(self.units.version, version, "A unit that just stopped is drawn somewhere new")
+        version = self.units.version
+        self.units.update(1/TICK_RATE)
+        self.assertEqual(self.units.version, version, "Nothing moved, nothing to redraw")
+
+    def test_many_units(self):
+        rng = numpy.random.default_rng(3)
+        tanks = self.units.add(TANK, rng.uniform(0, 800, (300, 2)) + (0, WINDOWSIZE-800), rng.uniform(-1, 1, (300, 2)))
+        missiles = self.units.add(MISSILE, rng.uniform(0, 800, (300, 2)) + (0, WINDOWSIZE-800), rng.uniform(-1, 1, (300, 2)))
+        self.assertEqual(len(self.units), 600)
+        speeds = numpy.hypot(*self.units.velocities[missiles].T)
+        self.assertTrue(numpy.allclose(speeds, 4*VEL*TICK_RATE))
+        self.units.update(1/TICK_RATE)
+
+        # the same hits testing every tank against every missile finds
+        expected = []
+        for tank in tanks.tolist():
+            for missile in missiles.tolist():
+                distance = numpy.hypot(*(self.units.positions[tank] - self.units.positions[missile]))
+                if self.units.alive[missile] and distance < UNIT_RADII[TANK] + UNIT_RADII[MISSILE]:
+                    expected.append((tank, missile))
+        firsts, seconds = self.units.collisions(TANK, MISSILE)
+        self.assertEqual(sorted(zip(firsts.tolist(), seconds.tolist())), expected)
+        self.assertTrue(len(expected) > 0)
+        self.assertEqual(sorted(self.units.query(400, WINDOWSIZE-400, 50)),
+                         [index for index in self.units.get_live().tolist()
+                          if numpy.hypot(*(self.units.positions[index] - (400, WINDOWSIZE-400))) <= 50])
+
+    def test_draw(self):
+        surface = pygame.Surface((WINDOWSIZE, WINDOWSIZE))
+        self.units.add(TANK, [(100, 100), (5000, 100)])
+        self.units.add(BUILDING, (300, 300))
+        self.assertEqual(self.units.draw(surface, camera_class.Camera(tiles=10), asset_class.ImageCache()), 1,
+                         "Only the tank in view should be drawn, buildings are drawn as tiles")
+
+
+if __name__ == '__main__':
+    unittest.main()